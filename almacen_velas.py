@@ -0,0 +1,371 @@
+# almacen_velas.py - ALMACÉN INCREMENTAL DE VELAS OHLCV EN MEMORIA
+import os
+import json
+import logging
+from threading import Lock
+
+import numpy as np
+
+from config_mejorada import ALMACEN_VELAS_CONFIG, MARKET_SESSIONS
+
+logger = logging.getLogger(__name__)
+
+# Duración aproximada de los periodos de Yahoo (range=...) en segundos
+PERIODOS_SEGUNDOS = {
+    '1d': 86400,
+    '5d': 5 * 86400,
+    '1mo': 31 * 86400,
+    '3mo': 92 * 86400,
+    '6mo': 183 * 86400,
+    '1y': 366 * 86400,
+    '2y': 731 * 86400
+}
+
+# Duración de los intervalos de vela en segundos
+INTERVALOS_SEGUNDOS = {
+    '1m': 60, '2m': 120, '5m': 300, '15m': 900, '30m': 1800,
+    '60m': 3600, '90m': 5400, '1h': 3600, '2h': 7200, '4h': 14400, '1d': 86400
+}
+
+COLUMNAS = ('open', 'high', 'low', 'close', 'volume')
+INDICE_COLUMNA = {col: i for i, col in enumerate(COLUMNAS)}
+
+class FrameVelas:
+    """
+    Velas alineadas: timestamp int64 (n,) y valores float64 (5, n) en orden C,
+    una fila contigua por columna OHLCV. frame['close'] devuelve una vista,
+    no una copia, así que los indicadores trabajan sobre los datos del almacén.
+
+    Se accede como el antiguo dict de listas (frame['high'], len(frame['close'])),
+    pero las columnas siempre tienen la misma longitud que frame['timestamp'].
+    """
+
+    __slots__ = ('timestamp', 'valores')
+
+    def __init__(self, timestamp, valores):
+        self.timestamp = timestamp
+        self.valores = valores
+
+    @classmethod
+    def vacio(cls):
+        return cls(np.empty(0, dtype=np.int64), np.empty((len(COLUMNAS), 0), dtype=np.float64))
+
+    @classmethod
+    def desde_yahoo(cls, result):
+        """
+        Parser vectorizado de un resultado chart de Yahoo
+
+        Cada columna se convierte de una vez (None -> NaN) y las velas con
+        algún OHLC ausente se descartan en bloque con una máscara, de forma
+        que todas las columnas quedan alineadas con timestamp.
+        """
+        timestamp = np.asarray(result.get('timestamp') or [], dtype=np.int64)
+        quote = (result.get('indicators', {}).get('quote') or [{}])[0]
+
+        valores = np.full((len(COLUMNAS), len(timestamp)), np.nan)
+        for i, col in enumerate(COLUMNAS):
+            serie = quote.get(col)
+            if serie is not None and len(serie) == len(timestamp):
+                valores[i] = np.array(serie, dtype=np.float64)
+
+        volumen = valores[INDICE_COLUMNA['volume']]
+        volumen[np.isnan(volumen)] = 0.0  # Forex e índices no traen volumen
+
+        validas = ~np.isnan(valores[:INDICE_COLUMNA['volume']]).any(axis=0)
+        if not validas.all():
+            timestamp = timestamp[validas]
+            valores = valores[:, validas]
+
+        return cls(timestamp, np.ascontiguousarray(valores))
+
+    def __len__(self):
+        return len(self.timestamp)
+
+    def __getitem__(self, columna):
+        if columna == 'timestamp':
+            return self.timestamp
+        return self.valores[INDICE_COLUMNA[columna]]
+
+    def __contains__(self, columna):
+        return columna == 'timestamp' or columna in INDICE_COLUMNA
+
+    def get(self, columna, defecto=None):
+        return self[columna] if columna in self else defecto
+
+    def keys(self):
+        return ('timestamp',) + COLUMNAS
+
+    def desde(self, inicio):
+        """Frame de solo lectura desde la vela inicio (vistas, sin copiar)"""
+        timestamp = self.timestamp[inicio:]
+        valores = self.valores[:, inicio:]
+        timestamp.flags.writeable = False
+        valores.flags.writeable = False
+        return FrameVelas(timestamp, valores)
+
+    def remuestrear(self, segundos, ancla=0):
+        """
+        Agregar a velas de mayor duración de forma vectorizada
+
+        Cada vela cae en el bloque (timestamp - ancla) // segundos; por bloque
+        open es el primero, high/low el máximo/mínimo (reduceat), close el
+        último y volume la suma. La última vela puede estar aún en curso.
+        """
+        if not len(self):
+            return self
+
+        bloques = (self.timestamp - ancla) // segundos
+        inicios = np.flatnonzero(np.r_[True, bloques[1:] != bloques[:-1]])
+        finales = np.r_[inicios[1:], len(self)] - 1
+
+        valores = np.empty((len(COLUMNAS), len(inicios)))
+        valores[INDICE_COLUMNA['open']] = self['open'][inicios]
+        valores[INDICE_COLUMNA['high']] = np.maximum.reduceat(self['high'], inicios)
+        valores[INDICE_COLUMNA['low']] = np.minimum.reduceat(self['low'], inicios)
+        valores[INDICE_COLUMNA['close']] = self['close'][finales]
+        valores[INDICE_COLUMNA['volume']] = np.add.reduceat(self['volume'], inicios)
+
+        return FrameVelas(bloques[inicios] * segundos + ancla, valores)
+
+    def fusionar(self, nuevo):
+        """Sustituir desde la primera vela de nuevo y añadir el resto al final"""
+        if not len(nuevo):
+            return self
+        corte = int(np.searchsorted(self.timestamp, nuevo.timestamp[0], side='left'))
+        return FrameVelas(
+            np.concatenate((self.timestamp[:corte], nuevo.timestamp)),
+            np.concatenate((self.valores[:, :corte], nuevo.valores), axis=1)
+        )
+
+class SerieVelas:
+    """Velas de un (símbolo, intervalo) y metadatos de cobertura"""
+
+    def __init__(self, frame=None):
+        self.frame = frame if frame is not None else FrameVelas.vacio()
+        self.inicio_cubierto = None   # Desde cuándo la serie está completa (epoch s)
+        self.retencion_segundos = 0   # Mayor periodo pedido: lo que se conserva
+        self.ultima_descarga = None   # Epoch s de la última fusión
+
+    def __len__(self):
+        return len(self.frame)
+
+    def a_dict(self):
+        return {
+            'inicio_cubierto': self.inicio_cubierto,
+            'retencion_segundos': self.retencion_segundos,
+            'ultima_descarga': self.ultima_descarga
+        }
+
+    @classmethod
+    def desde_disco(cls, frame, meta):
+        """Serie sobre arrays mapeados en memoria (solo lectura, sin copiar)"""
+        serie = cls(frame)
+        serie.inicio_cubierto = meta.get('inicio_cubierto')
+        serie.retencion_segundos = meta.get('retencion_segundos', 0)
+        serie.ultima_descarga = meta.get('ultima_descarga')
+        return serie
+
+class AlmacenVelas:
+    """
+    Almacén de velas por (símbolo, intervalo) que solo descarga lo nuevo
+
+    La primera petición (o una que pida más historia de la cubierta) es
+    completa con range=periodo; las siguientes piden desde la última vela
+    guardada (period1/period2), que se reemplaza por si aún estaba abierta.
+    Lo nuevo se añade al final y lo que excede la retención se recorta.
+
+    Solo se descarga el intervalo base: 4h, 1d y demás múltiplos se
+    derivan de él con remuestrear, sin peticiones adicionales.
+
+    Con persistencia activada cada serie se guarda en disco como dos arrays
+    de tipo fijo (timestamps int64 y OHLCV float64 5xN, más metadatos .json)
+    y se abre mapeada en memoria la primera vez que se pide, así que un
+    reinicio no repite las descargas.
+    """
+
+    def __init__(self, config=None):
+        config = config or ALMACEN_VELAS_CONFIG
+        self.series = {}
+        self.max_velas = config.get('max_velas', 5000)
+        self.directorio = config.get('directorio') if config.get('persistir') else None
+        self.intervalo_base = config.get('intervalo_base', '1h')
+        # Velas derivadas alineadas con la apertura de la primera sesión (hora UTC)
+        self.ancla_segundos = min(s['inicio'] for s in MARKET_SESSIONS.values()) * 3600
+        self.lock = Lock()
+        self.estadisticas = {
+            'descargas_completas': 0,
+            'descargas_delta': 0,
+            'velas_recibidas': 0,
+            'series_desde_disco': 0
+        }
+
+        logger.info("✅ Almacén de velas inicializado")
+
+    def _ruta(self, simbolo, intervalo, sufijo):
+        return os.path.join(self.directorio, f"{simbolo}_{intervalo}{sufijo}")
+
+    def _serie(self, simbolo, intervalo):
+        """Serie en memoria o, la primera vez, abierta desde disco (lazy loading)"""
+        clave = (simbolo, intervalo)
+        if clave not in self.series and self.directorio:
+            serie = self._cargar_serie(simbolo, intervalo)
+            if serie is not None:
+                self.series[clave] = serie
+        return self.series.get(clave)
+
+    def _cargar_serie(self, simbolo, intervalo):
+        """Abrir los .npy con mmap_mode='r' y sus metadatos; None si no existen o están dañados"""
+        try:
+            with open(self._ruta(simbolo, intervalo, '.json')) as f:
+                meta = json.load(f)
+            timestamp = np.load(self._ruta(simbolo, intervalo, '_ts.npy'), mmap_mode='r')
+            valores = np.load(self._ruta(simbolo, intervalo, '_ohlcv.npy'), mmap_mode='r')
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            logger.warning(f"⚠️ Velas en disco ilegibles {simbolo} {intervalo}, se descargan de nuevo: {e}")
+            return None
+
+        if (timestamp.dtype != np.int64 or valores.dtype != np.float64 or
+                valores.shape != (len(COLUMNAS), len(timestamp))):
+            logger.warning(f"⚠️ Formato de velas distinto en disco para {simbolo} {intervalo}, se ignora")
+            return None
+
+        self.estadisticas['series_desde_disco'] += 1
+        logger.info(f"💾 Velas desde disco: {simbolo} {intervalo} - {len(timestamp)} registros")
+        return SerieVelas.desde_disco(FrameVelas(timestamp, valores), meta)
+
+    def _guardar_serie(self, simbolo, intervalo, serie):
+        """Escritura atómica: datos primero, metadatos después"""
+        try:
+            os.makedirs(self.directorio, exist_ok=True)
+            for sufijo, array in (('_ts.npy', serie.frame.timestamp), ('_ohlcv.npy', serie.frame.valores)):
+                ruta_npy = self._ruta(simbolo, intervalo, sufijo)
+                temporal = f"{ruta_npy}.tmp"
+                with open(temporal, 'wb') as f:
+                    np.save(f, array)
+                os.replace(temporal, ruta_npy)
+
+            ruta_json = self._ruta(simbolo, intervalo, '.json')
+            temporal = f"{ruta_json}.tmp"
+            with open(temporal, 'w') as f:
+                json.dump(serie.a_dict(), f)
+            os.replace(temporal, ruta_json)
+        except OSError as e:
+            logger.warning(f"⚠️ No se pudieron guardar velas {simbolo} {intervalo}: {e}")
+
+    def es_derivable(self, intervalo):
+        """Intervalos múltiplos del base (hasta 1 día) que se construyen localmente"""
+        base = INTERVALOS_SEGUNDOS[self.intervalo_base]
+        segundos = INTERVALOS_SEGUNDOS.get(intervalo)
+        return segundos is not None and base < segundos <= 86400 and segundos % base == 0
+
+    def remuestrear(self, frame, intervalo):
+        """Frame del intervalo base -> intervalo derivado alineado a la sesión"""
+        return frame.remuestrear(INTERVALOS_SEGUNDOS[intervalo], self.ancla_segundos)
+
+    def _duracion_periodo(self, periodo):
+        """Segundos de un periodo de Yahoo (por defecto 1 mes)"""
+        return PERIODOS_SEGUNDOS.get(periodo, PERIODOS_SEGUNDOS['1mo'])
+
+    def _necesita_completa(self, serie, periodo, ahora_ts):
+        """Sin datos, con menos historia de la pedida o con un hueco mayor que la retención"""
+        if serie is None or not len(serie) or serie.inicio_cubierto is None:
+            return True
+        duracion = self._duracion_periodo(periodo)
+        if ahora_ts - duracion < serie.inicio_cubierto:
+            return True
+        return ahora_ts - int(serie.frame.timestamp[-1]) > max(duracion, serie.retencion_segundos)
+
+    def parametros_descarga(self, simbolo, intervalo, periodo, ahora_ts):
+        """Parámetros de la petición chart: completa (range) o delta (period1/period2)"""
+        with self.lock:
+            serie = self._serie(simbolo, intervalo)
+            if self._necesita_completa(serie, periodo, ahora_ts):
+                return {'range': periodo, 'interval': intervalo}
+            return {
+                'period1': int(serie.frame.timestamp[-1]),
+                'period2': int(ahora_ts),
+                'interval': intervalo
+            }
+
+    def fusionar(self, simbolo, intervalo, periodo, nuevo, ahora_ts):
+        """
+        Incorporar velas descargadas (FrameVelas) a la serie
+
+        Las velas guardadas a partir de la primera recibida se sustituyen
+        (la última suele ser la vela en curso); el resto se conserva.
+        """
+        with self.lock:
+            serie = self._serie(simbolo, intervalo)
+            completa = self._necesita_completa(serie, periodo, ahora_ts)
+            if serie is None:
+                serie = self.series[(simbolo, intervalo)] = SerieVelas()
+
+            self.estadisticas['descargas_completas' if completa else 'descargas_delta'] += 1
+            self.estadisticas['velas_recibidas'] += len(nuevo)
+            serie.frame = serie.frame.fusionar(nuevo)
+
+            duracion = self._duracion_periodo(periodo)
+            serie.retencion_segundos = max(serie.retencion_segundos, duracion)
+            if completa:
+                serie.inicio_cubierto = ahora_ts - duracion
+            serie.ultima_descarga = ahora_ts
+
+            self._recortar(serie, ahora_ts)
+            if self.directorio:
+                self._guardar_serie(simbolo, intervalo, serie)
+
+    def edad_descarga(self, simbolo, intervalo, periodo, ahora_ts):
+        """
+        Segundos desde la última descarga de la serie (también de antes de un
+        reinicio); None si no hay serie o no cubre el periodo pedido
+        """
+        with self.lock:
+            serie = self._serie(simbolo, intervalo)
+            if serie is None or serie.ultima_descarga is None or self._necesita_completa(serie, periodo, ahora_ts):
+                return None
+            return ahora_ts - serie.ultima_descarga
+
+    def _recortar(self, serie, ahora_ts):
+        """Descartar velas fuera de la retención o por encima de max_velas"""
+        limite = ahora_ts - serie.retencion_segundos
+        inicio = int(np.searchsorted(serie.frame.timestamp, limite, side='left'))
+        inicio = max(inicio, len(serie) - self.max_velas)
+        if inicio > 0:
+            # Copia compacta para que cada columna siga siendo contigua
+            serie.frame = FrameVelas(
+                serie.frame.timestamp[inicio:].copy(),
+                np.ascontiguousarray(serie.frame.valores[:, inicio:])
+            )
+            serie.inicio_cubierto = max(serie.inicio_cubierto or limite, limite)
+
+    def obtener(self, simbolo, intervalo, periodo, ahora_ts):
+        """
+        Velas del periodo pedido como FrameVelas de solo lectura
+
+        Son vistas sobre la serie, sin copiar: una fusión posterior crea
+        arrays nuevos, así que el frame entregado no cambia bajo el llamador.
+
+        Returns:
+            FrameVelas o None si no hay serie
+        """
+        with self.lock:
+            serie = self._serie(simbolo, intervalo)
+            if serie is None or not len(serie):
+                return None
+
+            inicio = int(np.searchsorted(serie.frame.timestamp, ahora_ts - self._duracion_periodo(periodo), side='left'))
+            return serie.frame.desde(inicio)
+
+    def obtener_estadisticas(self):
+        """Series guardadas, velas totales y descargas completas/delta"""
+        with self.lock:
+            return {
+                'series': len(self.series),
+                'velas_totales': sum(len(s) for s in self.series.values()),
+                **self.estadisticas
+            }
+
+# Instancia global compartida por todas las instancias de IndicadoresReales
+almacen_velas = AlmacenVelas()
@@ -2,7 +2,6 @@
 import os
 import time
 import schedule
-import requests
 from datetime import datetime
 import logging
 import sys
@@ -37,6 +36,20 @@ class BotTradingCorregido:
         self.detector_movimientos = DetectorMovimientos()
         self.alerta_noticias = AlertaNoticias()
         
+        # FEED EN SEGUNDO PLANO: mantiene la central caliente y alimenta al detector
+        self.feed_precios = None
+        if FEED_PRECIOS_CONFIG.get('habilitado'):
+            self.feed_precios = FeedPrecios(self.central_precios, self.gestor_sesiones.obtener_activos_recomendados)
+            self.feed_precios.suscribir('movimientos', self._procesar_precio_feed)
+        
+        # CLIENTE ASÍNCRONO: precios, históricos y noticias del ciclo en un solo gather
+        self.cliente_async = None
+        if CLIENTE_ASYNC_CONFIG.get('habilitado'):
+            self.cliente_async = ClienteDatosAsync(
+                alerta_noticias=self.alerta_noticias,
+                central_precios=self.central_precios
+            )
+        
         # Estrategia principal
         self.estrategia_mejorada = None
         
@@ -82,7 +95,7 @@ class BotTradingCorregido:
                 'parse_mode': 'HTML'
             }
             
-            response = requests.post(url, json=payload, timeout=10)
+            response = transporte_http.post(url, json=payload, timeout=10)
             return response.status_code == 200
                 
         except Exception as e:
@@ -123,11 +136,20 @@ class BotTradingCorregido:
             activos_recomendados = self.gestor_sesiones.obtener_activos_recomendados()
             logger.info(f"📈 Actualizando {len(activos_recomendados)} precios...")
             
-            # Actualizar todos los precios primero
-            precios_actuales = self.central_precios.obtener_precios_lote(activos_recomendados)
+            # Actualizar todos los precios primero (una ráfaga asíncrona o en paralelo con deadline)
+            eventos_noticias = None
+            if self.cliente_async:
+                datos_ciclo = self.cliente_async.ejecutar_ciclo(activos_recomendados)
+                precios_actuales = datos_ciclo['precios']
+                eventos_noticias = datos_ciclo['noticias']
+            else:
+                precios_actuales = self.central_precios.obtener_precios_lote(activos_recomendados, concurrente=True)
             
             # 2. VERIFICAR NOTICIAS
-            self._verificar_noticias_alto_impacto()
+            self._verificar_noticias_alto_impacto(eventos_noticias)
+            
+            # Indicadores de todos los activos en una sola pasada (los reutiliza la estrategia)
+            indicadores_reales.calcular_indicadores_lote(activos_recomendados, precios_actuales)
             
             # 3. PROCESAR CADA ACTIVO CON PRECIO CONSISTENTE
             señales_generadas = 0
@@ -144,16 +166,10 @@ class BotTradingCorregido:
                 
                 logger.info(f"🔍 Analizando {par} = {precio_actual:.5f}")
                 
-                # A. DETECTAR MOVIMIENTOS CON PRECIO CENTRAL
-                alertas_movimiento = self.detector_movimientos.actualizar_precio(par, precio_actual)
-                if alertas_movimiento:
-                    for alerta in alertas_movimiento:
-                        self.estadisticas['señales_movimientos'] += 1
-                        # VERIFICAR CONSISTENCIA antes de enviar
-                        if self.central_precios.verificar_consistencia_precios(par, alerta['precio_actual']):
-                            self.enviar_alerta_movimiento_corregida(alerta)
-                        else:
-                            logger.warning(f"⚠️ Movimiento descartado por inconsistencia: {par}")
+                # A. DETECTAR MOVIMIENTOS CON PRECIO CENTRAL (si no lo hace ya el feed)
+                if not (self.feed_precios and self.feed_precios.esta_activo()):
+                    alertas_movimiento = self.detector_movimientos.actualizar_precio(par, precio_actual)
+                    self._procesar_alertas_movimiento(par, alertas_movimiento)
                 
                 # B. GENERAR SEÑAL S/R CON PRECIO CENTRAL
                 señal_sr = self.generar_señal_sr_corregida(par, precio_actual)
@@ -177,6 +193,24 @@ class BotTradingCorregido:
         except Exception as e:
             logger.error(f"💥 Error en ciclo corregido: {e}")
     
+    def _procesar_precio_feed(self, par, precio_actual, timestamp):
+        """Suscriptor del feed: detección de movimientos en cuanto llega el precio"""
+        alertas_movimiento = self.detector_movimientos.actualizar_precio(par, precio_actual, timestamp)
+        self._procesar_alertas_movimiento(par, alertas_movimiento)
+    
+    def _procesar_alertas_movimiento(self, par, alertas_movimiento):
+        """Verificar consistencia y enviar alertas de movimiento"""
+        if not alertas_movimiento:
+            return
+        
+        for alerta in alertas_movimiento:
+            self.estadisticas['señales_movimientos'] += 1
+            # VERIFICAR CONSISTENCIA antes de enviar
+            if self.central_precios.verificar_consistencia_precios(par, alerta['precio_actual']):
+                self.enviar_alerta_movimiento_corregida(alerta)
+            else:
+                logger.warning(f"⚠️ Movimiento descartado por inconsistencia: {par}")
+    
     def generar_señal_sr_corregida(self, par, precio_actual):
         """
         Generar señal S/R usando precio centralizado
@@ -266,10 +300,10 @@ class BotTradingCorregido:
         if self.enviar_telegram(mensaje.strip()):
             logger.info(f"✅ Alerta movimiento enviada: {alerta['par']}")
     
-    def _verificar_noticias_alto_impacto(self):
-        """Verificar noticias de alto impacto"""
+    def _verificar_noticias_alto_impacto(self, eventos=None):
+        """Verificar noticias de alto impacto (eventos ya descargados si se pasan)"""
         try:
-            alertas_noticias = self.alerta_noticias.obtener_alertas_activas()
+            alertas_noticias = self.alerta_noticias.obtener_alertas_activas(eventos)
             if alertas_noticias:
                 for alerta in alertas_noticias:
                     self.estadisticas['señales_noticias'] += 1
@@ -350,6 +384,14 @@ class BotTradingCorregido:
         # Programar limpieza de cache cada hora
         schedule.every(1).hours.do(self.central_precios.limpiar_cache_antiguo)
         
+        # Históricos listos antes del primer ciclo (con tiempo máximo acotado)
+        if PRECARGA_CONFIG.get('habilitado'):
+            self._precargar_historicos()
+        
+        # Feed de precios en segundo plano
+        if self.feed_precios:
+            self.feed_precios.iniciar()
+        
         # Primer análisis
         self.ciclo_analisis_corregido()
         
@@ -364,9 +406,25 @@ class BotTradingCorregido:
                 logger.error(f"❌ Error en bucle principal: {e}")
                 time.sleep(60)
     
+    def _precargar_historicos(self):
+        """Precarga paralela de TOP_PARES y activos de la sesión actual"""
+        try:
+            simbolos = TOP_PARES + self.gestor_sesiones.obtener_activos_recomendados()
+            indicadores_reales.precargar_historicos(
+                simbolos,
+                PRECARGA_CONFIG['historicos'],
+                max_workers=PRECARGA_CONFIG.get('max_workers', 4),
+                presupuesto=PRECARGA_CONFIG.get('presupuesto_peticiones', 40),
+                timeout=PRECARGA_CONFIG.get('timeout_segundos', 60)
+            )
+        except Exception as e:
+            logger.error(f"❌ Error en precarga de históricos: {e}")
+    
     def detener(self):
         """Detener bot"""
         self.activo = False
+        if self.feed_precios:
+            self.feed_precios.detener()
         logger.info("🛑 Bot corregido detenido")
         
         self.enviar_telegram(
@@ -382,6 +440,11 @@ from gestor_sesiones import GestorSesionesMercado
 from analisis_correlaciones import AnalizadorCorrelaciones
 from detector_movimientos import DetectorMovimientos
 from noticias_alerta_corregido import AlertaNoticias
+from feed_precios import FeedPrecios
+from cliente_async import ClienteDatosAsync
+from config_mejorada import FEED_PRECIOS_CONFIG, CLIENTE_ASYNC_CONFIG, PRECARGA_CONFIG, TOP_PARES
+from indicadores_reales import indicadores_reales
+from transporte_http import transporte_http
 
 if __name__ == "__main__":
     print("=" * 60)
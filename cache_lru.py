@@ -0,0 +1,135 @@
+# cache_lru.py - CACHE LRU ACOTADA EN BYTES CON EXPIRACIÓN EN SEGUNDO PLANO
+import sys
+import time
+import logging
+from collections import OrderedDict
+from threading import Event, Lock, Thread
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+def tamaño_bytes(valor):
+    """Tamaño aproximado de una entrada: arrays por nbytes, contenedores por elementos"""
+    if isinstance(valor, np.ndarray):
+        return valor.nbytes
+    if hasattr(valor, 'valores') and hasattr(valor, 'timestamp'):  # FrameVelas
+        return valor.valores.nbytes + valor.timestamp.nbytes
+    if isinstance(valor, dict):
+        return sys.getsizeof(valor) + sum(tamaño_bytes(v) for v in valor.values())
+    if isinstance(valor, (list, tuple)):
+        return sys.getsizeof(valor) + sum(sys.getsizeof(v) for v in valor)
+    return sys.getsizeof(valor)
+
+class CacheLRU:
+    """
+    Cache con límite de memoria: al superar max_bytes se expulsan las
+    entradas menos usadas recientemente. Las caducadas (ttl) se descartan
+    al leerlas y, además, en un barrido periódico en segundo plano.
+    """
+
+    def __init__(self, max_bytes, ttl, intervalo_barrido=60):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.intervalo_barrido = intervalo_barrido
+        self.entradas = OrderedDict()  # clave -> (valor, expira, bytes); la más reciente al final
+        self.bytes_actuales = 0
+        self.lock = Lock()
+        self._detener = Event()
+        self._hilo_barrido = None
+        self.estadisticas = {
+            'aciertos': 0,
+            'fallos': 0,
+            'expulsiones': 0,
+            'expiradas': 0
+        }
+
+    def _asegurar_barrido(self):
+        """Hilo de barrido (lazy: solo cuando la cache empieza a usarse)"""
+        if self._hilo_barrido is None:
+            self._hilo_barrido = Thread(target=self._bucle_barrido, name="barrido-cache", daemon=True)
+            self._hilo_barrido.start()
+
+    def _bucle_barrido(self):
+        while not self._detener.wait(self.intervalo_barrido):
+            eliminadas = self.barrer_expiradas()
+            if eliminadas:
+                logger.debug(f"🧹 Barrido de cache: {eliminadas} entradas expiradas")
+
+    def _eliminar(self, clave):
+        _, _, tamaño = self.entradas.pop(clave)
+        self.bytes_actuales -= tamaño
+
+    def obtener(self, clave):
+        """Valor vigente (y marcado como usado) o None"""
+        with self.lock:
+            entrada = self.entradas.get(clave)
+            if entrada is None:
+                self.estadisticas['fallos'] += 1
+                return None
+
+            if entrada[1] <= time.monotonic():
+                self._eliminar(clave)
+                self.estadisticas['expiradas'] += 1
+                self.estadisticas['fallos'] += 1
+                return None
+
+            self.entradas.move_to_end(clave)
+            self.estadisticas['aciertos'] += 1
+            return entrada[0]
+
+    def guardar(self, clave, valor, edad_segundos=0):
+        """
+        Guardar una entrada; edad_segundos adelanta su expiración si el valor
+        ya venía con antigüedad (p. ej. velas descargadas antes de un reinicio)
+        """
+        tamaño = tamaño_bytes(valor)
+        with self.lock:
+            if clave in self.entradas:
+                self._eliminar(clave)
+
+            if tamaño > self.max_bytes:
+                logger.warning(f"⚠️ Entrada de cache demasiado grande ({tamaño} bytes): {clave}")
+                return
+
+            self.entradas[clave] = (valor, time.monotonic() + self.ttl - edad_segundos, tamaño)
+            self.bytes_actuales += tamaño
+
+            while self.bytes_actuales > self.max_bytes:
+                self._eliminar(next(iter(self.entradas)))
+                self.estadisticas['expulsiones'] += 1
+
+            self._asegurar_barrido()
+
+    def barrer_expiradas(self):
+        """Eliminar todas las entradas caducadas; devuelve cuántas"""
+        ahora = time.monotonic()
+        with self.lock:
+            caducadas = [clave for clave, (_, expira, _) in self.entradas.items() if expira <= ahora]
+            for clave in caducadas:
+                self._eliminar(clave)
+            self.estadisticas['expiradas'] += len(caducadas)
+        return len(caducadas)
+
+    def limpiar(self):
+        with self.lock:
+            self.entradas.clear()
+            self.bytes_actuales = 0
+
+    def detener(self):
+        """Parar el hilo de barrido"""
+        self._detener.set()
+
+    def __len__(self):
+        return len(self.entradas)
+
+    def obtener_estadisticas(self):
+        with self.lock:
+            consultas = self.estadisticas['aciertos'] + self.estadisticas['fallos']
+            return {
+                'entradas': len(self.entradas),
+                'bytes': self.bytes_actuales,
+                'max_bytes': self.max_bytes,
+                'tasa_aciertos': round(self.estadisticas['aciertos'] / consultas, 3) if consultas else 0.0,
+                **self.estadisticas
+            }
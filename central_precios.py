@@ -1,23 +1,50 @@
 # central_precios.py - FUENTE ÚNICA Y CENTRALIZADA DE PRECIOS
 import time
 import logging
+from concurrent.futures import Future, ThreadPoolExecutor, wait
 from datetime import datetime, timedelta
 from threading import Lock
 
 logger = logging.getLogger(__name__)
 
+class PrecioCentral(float):
+    """
+    Precio devuelto por la central: se comporta como float y además
+    indica su antigüedad para que cada consumidor decida si le basta,
+    y si es simulado (fallback local, nunca cacheado)
+    """
+    
+    def __new__(cls, precio, edad_segundos=0.0):
+        instancia = super().__new__(cls, precio)
+        instancia.edad_segundos = edad_segundos
+        instancia.simulado = getattr(precio, 'simulado', False)
+        return instancia
+
 class CentralPrecios:
     """
     Fuente centralizada de precios para evitar inconsistencias
     Todos los módulos obtienen precios desde aquí
     """
     
-    def __init__(self):
+    def __init__(self, max_workers=6, deadline_ciclo=20):
         self.precios_actuales = {}
         self.ultima_actualizacion = {}
+        # Stale-while-revalidate: hasta cache_ttl el precio es fresco; hasta
+        # cache_ttl_maximo se devuelve al instante y se refresca en segundo plano
         self.cache_ttl = 30  # 30 segundos de cache
+        self.cache_ttl_maximo = 120  # Pasado este tiempo el llamador espera a la red
+        # El lock solo protege los diccionarios, nunca se retiene durante I/O
         self.lock = Lock()
         
+        # Single-flight: una sola petición en curso por símbolo {simbolo: Future}
+        self._en_vuelo = {}
+        self._refrescos_programados = set()
+        
+        # Obtención concurrente en lote (pool acotado + deadline por ciclo)
+        self.max_workers = max_workers
+        self.deadline_ciclo = deadline_ciclo  # segundos
+        self._executor = None
+        
         # Módulo de obtención de precios
         self.yahoo_api = None
         
@@ -34,6 +61,56 @@ class CentralPrecios:
                 return None
         return self.yahoo_api
 
+    def _get_executor(self):
+        """Pool de hilos acotado para obtención concurrente (lazy loading)"""
+        with self.lock:
+            return self._asegurar_executor()
+
+    def _asegurar_executor(self):
+        """Crear el pool si aún no existe (llamar con self.lock tomado)"""
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                max_workers=self.max_workers,
+                thread_name_prefix="central_precios"
+            )
+        return self._executor
+
+    def _obtener_precio_fresco(self, simbolo, precio_cacheado=None):
+        """
+        Obtener precio fresco sin retener el lock durante la llamada de red
+        (solo lo ejecuta el hilo líder de cada símbolo)
+        """
+        try:
+            yahoo = self._get_yahoo_api()
+            precio = yahoo.obtener_precio_redundante(simbolo) if yahoo else None
+        except Exception as e:
+            logger.error(f"❌ Error obteniendo precio {simbolo}: {e}")
+            precio = None
+        
+        if precio and getattr(precio, 'simulado', False):
+            # Fallback simulado: nunca a cache; mejor el último precio real si lo hay
+            if precio_cacheado:
+                logger.warning(f"🔄 Fuentes agotadas, usando precio cacheado: {simbolo}")
+                return precio_cacheado
+            logger.warning(f"🧪 Precio simulado para {simbolo} (no se cachea)")
+            return precio
+        
+        if precio and precio > 0:
+            with self.lock:
+                self.precios_actuales[simbolo] = precio
+                self.ultima_actualizacion[simbolo] = datetime.now()
+            logger.info(f"✅ Precio actualizado: {simbolo} = {precio}")
+            return precio
+        
+        if precio is not None:
+            logger.warning(f"⚠️ Precio inválido para {simbolo}: {precio}")
+        
+        if precio_cacheado:
+            logger.warning(f"🔄 Usando precio cacheado por fallo: {simbolo}")
+            return precio_cacheado
+        
+        return None
+
     def obtener_precio_actual(self, simbolo, forzar_actualizacion=False):
         """
         Obtener precio actual desde fuente centralizada
@@ -43,75 +120,230 @@ class CentralPrecios:
             forzar_actualizacion (bool): Ignorar cache y obtener precio fresco
             
         Returns:
-            float or None: Precio actual o None si error
+            PrecioCentral or None: Precio actual (float con edad_segundos) o None si error
         """
         with self.lock:
             # Verificar si tenemos precio cacheado y válido
             ahora = datetime.now()
             precio_cacheado = self.precios_actuales.get(simbolo)
             ultima_actualizacion = self.ultima_actualizacion.get(simbolo)
+            edad = (ahora - ultima_actualizacion).total_seconds() if ultima_actualizacion else None
             
-            if (not forzar_actualizacion and 
-                precio_cacheado and 
-                ultima_actualizacion and 
-                (ahora - ultima_actualizacion).total_seconds() < self.cache_ttl):
-                logger.debug(f"📊 Precio desde cache: {simbolo} = {precio_cacheado}")
-                return precio_cacheado
-
-            # Obtener precio fresco
-            try:
-                yahoo = self._get_yahoo_api()
-                if yahoo:
-                    precio = yahoo.obtener_precio_redundante(simbolo)
-                    
-                    if precio and precio > 0:
-                        self.precios_actuales[simbolo] = precio
-                        self.ultima_actualizacion[simbolo] = ahora
-                        
-                        logger.info(f"✅ Precio actualizado: {simbolo} = {precio}")
-                        return precio
-                    else:
-                        logger.warning(f"⚠️ Precio inválido para {simbolo}: {precio}")
+            if not forzar_actualizacion and precio_cacheado and edad is not None:
+                if edad < self.cache_ttl:
+                    logger.debug(f"📊 Precio desde cache: {simbolo} = {precio_cacheado}")
+                    return PrecioCentral(precio_cacheado, edad)
                 
-                # Fallback a precio cacheado si disponible
-                if precio_cacheado:
-                    logger.warning(f"🔄 Usando precio cacheado por fallo: {simbolo}")
-                    return precio_cacheado
-                    
-                return None
-                
-            except Exception as e:
-                logger.error(f"❌ Error obteniendo precio {simbolo}: {e}")
-                
-                # Fallback a precio cacheado
-                if precio_cacheado:
-                    logger.warning(f"🔄 Usando precio cacheado por error: {simbolo}")
-                    return precio_cacheado
-                    
-                return None
+                if edad < self.cache_ttl_maximo:
+                    # Stale-while-revalidate: responder ya y refrescar en segundo plano
+                    self._programar_refresco(simbolo)
+                    logger.debug(f"📊 Precio desde cache ({edad:.0f}s, refrescando): {simbolo} = {precio_cacheado}")
+                    return PrecioCentral(precio_cacheado, edad)
+            
+            # Unirse a la petición en curso del mismo símbolo, o ser el líder
+            futuro = self._en_vuelo.get(simbolo)
+            es_lider = futuro is None
+            if es_lider:
+                futuro = Future()
+                self._en_vuelo[simbolo] = futuro
+        
+        if not es_lider:
+            logger.debug(f"🔗 Compartiendo petición en curso: {simbolo}")
+            return futuro.result()
+        
+        return self._ejecutar_peticion(simbolo, futuro, precio_cacheado)
+
+    def _ejecutar_peticion(self, simbolo, futuro, precio_cacheado):
+        """Petición del líder: obtener precio y publicarlo a quienes esperan"""
+        precio = None
+        try:
+            precio = self._obtener_precio_fresco(simbolo, precio_cacheado)
+            if precio is not None:
+                with self.lock:
+                    ultima_actualizacion = self.ultima_actualizacion.get(simbolo)
+                edad = (datetime.now() - ultima_actualizacion).total_seconds() if ultima_actualizacion else 0.0
+                precio = PrecioCentral(precio, edad)
+        finally:
+            with self.lock:
+                self._en_vuelo.pop(simbolo, None)
+            futuro.set_result(precio)
+        
+        return precio
 
-    def obtener_precios_lote(self, simbolos):
+    def _programar_refresco(self, simbolo):
+        """Encolar un refresco en segundo plano (llamar con self.lock tomado)"""
+        if simbolo in self._en_vuelo or simbolo in self._refrescos_programados:
+            return
+        
+        self._refrescos_programados.add(simbolo)
+        self._asegurar_executor().submit(self._refrescar_en_segundo_plano, simbolo)
+
+    def _refrescar_en_segundo_plano(self, simbolo):
+        """
+        Refresco asíncrono. El símbolo se registra como en vuelo solo al
+        empezar, así ningún hilo del pool espera a una tarea aún encolada
+        """
+        with self.lock:
+            self._refrescos_programados.discard(simbolo)
+            if simbolo in self._en_vuelo:
+                return
+            precio_cacheado = self.precios_actuales.get(simbolo)
+            futuro = Future()
+            self._en_vuelo[simbolo] = futuro
+        
+        try:
+            self._ejecutar_peticion(simbolo, futuro, precio_cacheado)
+        except Exception as e:
+            logger.error(f"❌ Error refrescando precio {simbolo}: {e}")
+
+    def obtener_precios_lote(self, simbolos, concurrente=False, deadline=None, forzar_actualizacion=False):
         """
         Obtener múltiples precios en lote para eficiencia
         
+        Los símbolos sin cache válido se piden juntos (una petición por
+        proveedor) y los que el lote no resuelva usan la vía individual.
+        
         Args:
             simbolos (list): Lista de símbolos
+            concurrente (bool): Resolver la vía individual en el pool de hilos
+            deadline (float): Segundos máximos del ciclo en modo concurrente
+                (por defecto self.deadline_ciclo)
+            forzar_actualizacion (bool): Ignorar cache y pedir todos los símbolos
             
         Returns:
-            dict: Diccionario con precios {simbolo: precio}
+            dict: Diccionario con precios {simbolo: precio}. En modo
+            concurrente puede ser parcial si vence el deadline.
         """
+        inicio = time.monotonic()
         precios = {}
         
+        # 1. Precios válidos en cache (stale-while-revalidate como en obtener_precio_actual)
+        with self.lock:
+            ahora = datetime.now()
+            for simbolo in ([] if forzar_actualizacion else simbolos):
+                precio_cacheado = self.precios_actuales.get(simbolo)
+                ultima_actualizacion = self.ultima_actualizacion.get(simbolo)
+                if precio_cacheado and ultima_actualizacion:
+                    edad = (ahora - ultima_actualizacion).total_seconds()
+                    if edad < self.cache_ttl:
+                        precios[simbolo] = PrecioCentral(precio_cacheado, edad)
+                    elif edad < self.cache_ttl_maximo:
+                        # Responder ya y refrescar en segundo plano, fuera del lote síncrono
+                        self._programar_refresco(simbolo)
+                        precios[simbolo] = PrecioCentral(precio_cacheado, edad)
+        
+        # 2. Petición en lote para el resto
+        pendientes = [s for s in simbolos if s not in precios]
+        if pendientes:
+            try:
+                yahoo = self._get_yahoo_api()
+                precios_lote = yahoo.obtener_precios_lote(pendientes) if yahoo else {}
+            except Exception as e:
+                logger.error(f"❌ Error obteniendo precios en lote: {e}")
+                precios_lote = {}
+            
+            precios.update(self.registrar_precios(precios_lote))
+            
+            if precios_lote:
+                logger.info(f"✅ Precios en lote: {len(precios_lote)}/{len(pendientes)} símbolos")
+        
+        # 3. Vía individual (fuentes redundantes) para los que falten
+        if concurrente:
+            restantes = [s for s in dict.fromkeys(simbolos) if s not in precios]
+            precios.update(self._obtener_precios_concurrentes(restantes, inicio, deadline, forzar_actualizacion))
+            return precios
+        
         for simbolo in simbolos:
-            precio = self.obtener_precio_actual(simbolo)
+            if simbolo in precios:
+                continue
+            precio = self.obtener_precio_actual(simbolo, forzar_actualizacion)
+            if precio:
+                precios[simbolo] = precio
+            else:
+                logger.warning(f"⚠️ No se pudo obtener precio para {simbolo}")
+        
+        return precios
+
+    def registrar_precios(self, precios):
+        """
+        Guardar en cache precios obtenidos fuera de la central (lote, cliente asíncrono);
+        los simulados se descartan
+        
+        Returns:
+            dict: Solo los precios válidos registrados, como PrecioCentral
+        """
+        registrados = {}
+        with self.lock:
+            ahora = datetime.now()
+            for simbolo, precio in precios.items():
+                if precio and precio > 0 and not getattr(precio, 'simulado', False):
+                    self.precios_actuales[simbolo] = precio
+                    self.ultima_actualizacion[simbolo] = ahora
+                    registrados[simbolo] = PrecioCentral(precio)
+        return registrados
+
+    def obtener_precio_cacheado(self, simbolo, servir_obsoleto=False):
+        """
+        Precio fresco (dentro de cache_ttl) sin tocar la red; None si no hay
+        
+        Con servir_obsoleto, hasta cache_ttl_maximo devuelve el precio
+        obsoleto y programa su refresco, como obtener_precio_actual
+        """
+        with self.lock:
+            precio = self.precios_actuales.get(simbolo)
+            ultima_actualizacion = self.ultima_actualizacion.get(simbolo)
+            if not precio or not ultima_actualizacion:
+                return None
+            
+            edad = (datetime.now() - ultima_actualizacion).total_seconds()
+            if edad < self.cache_ttl:
+                return PrecioCentral(precio, edad)
+            
+            if servir_obsoleto and edad < self.cache_ttl_maximo:
+                self._programar_refresco(simbolo)
+                return PrecioCentral(precio, edad)
+        
+        return None
+
+    def _obtener_precios_concurrentes(self, simbolos, inicio, deadline=None, forzar_actualizacion=False):
+        """Repartir símbolos en el pool y esperar hasta el deadline del ciclo"""
+        if not simbolos:
+            return {}
+        
+        if deadline is None:
+            deadline = self.deadline_ciclo
+        
+        executor = self._get_executor()
+        futuros = {
+            executor.submit(self.obtener_precio_actual, simbolo, forzar_actualizacion): simbolo
+            for simbolo in simbolos
+        }
+        
+        restante = max(0.0, deadline - (time.monotonic() - inicio))
+        completados, pendientes = wait(futuros, timeout=restante)
+        
+        precios = {}
+        for futuro in completados:
+            simbolo = futuros[futuro]
+            try:
+                precio = futuro.result()
+            except Exception as e:
+                logger.error(f"❌ Error obteniendo precio {simbolo}: {e}")
+                precio = None
+            
             if precio:
                 precios[simbolo] = precio
             else:
                 logger.warning(f"⚠️ No se pudo obtener precio para {simbolo}")
         
+        if pendientes:
+            # Los hilos siguen en segundo plano y actualizarán el cache al terminar
+            sin_respuesta = sorted(futuros[f] for f in pendientes)
+            logger.warning(f"⏱️ Deadline de {deadline}s vencido, resultados parciales. Sin respuesta: {sin_respuesta}")
+        
         return precios
 
-    def verificar_consistencia_precios(self, simbolo, precio_proporcionado, tolerancia=0.001):
+    def verificar_consistencia_precios(self, simbolo, precio_proporcionado, tolerancia=0.001, edad_maxima=None):
         """
         Verificar si un precio proporcionado es consistente con nuestra fuente
         
@@ -119,12 +351,18 @@ class CentralPrecios:
             simbolo (str): Símbolo del par
             precio_proporcionado (float): Precio a verificar
             tolerancia (float): Tolerancia porcentual (0.1%)
+            edad_maxima (float): Segundos máximos de antigüedad del precio central;
+                si es más viejo se fuerza una actualización (None = aceptar cache)
             
         Returns:
             bool: True si es consistente
         """
         precio_central = self.obtener_precio_actual(simbolo)
         
+        if (edad_maxima is not None and precio_central and 
+            precio_central.edad_segundos > edad_maxima):
+            precio_central = self.obtener_precio_actual(simbolo, forzar_actualizacion=True)
+        
         if not precio_central or not precio_proporcionado:
             return False
         
@@ -146,6 +384,7 @@ class CentralPrecios:
             'total_pares_registrados': total_pares,
             'precios_validos_actualmente': precios_validos,
             'cache_ttl_segundos': self.cache_ttl,
+            'cache_ttl_maximo_segundos': self.cache_ttl_maximo,
             'ultima_actualizacion': self.ultima_actualizacion
         }
 
@@ -0,0 +1,405 @@
+# cliente_async.py - CLIENTE ASYNCIO DE PRECIOS, HISTÓRICOS Y NOTICIAS
+"""
+Variante asyncio de la capa de datos para resolver toda la E/S de un ciclo
+en una sola ráfaga concurrente (un gather) sin hilos adicionales.
+
+Reutiliza la preparación y el parseo de las clases bloqueantes, así que
+respeta el mismo orden de fuentes por salud, los circuitos, los cubos de
+rate limit y el fallback local de YahooFinanceAPI.
+
+Con aiohttp instalado todo corre en el bucle de eventos; sin él, cada
+petición se delega en transporte_http mediante asyncio.to_thread.
+"""
+
+import time
+import asyncio
+import logging
+
+try:
+    import aiohttp
+except ImportError:  # Opcional: sin aiohttp se usa el transporte bloqueante
+    aiohttp = None
+
+from config_mejorada import CLIENTE_ASYNC_CONFIG, HTTP_CONFIG
+from indicadores_reales import indicadores_reales
+from transporte_http import transporte_http
+from yahoo_api_mejorado import YahooFinanceAPI
+
+logger = logging.getLogger(__name__)
+
+class ClienteDatosAsync:
+    """
+    Cliente asíncrono de precios (Yahoo, Twelve Data, Alpha Vantage),
+    históricos de Yahoo y calendario de noticias de Apify
+    """
+
+    def __init__(self, yahoo_api=None, indicadores=None, alerta_noticias=None, central_precios=None, config=None):
+        self.yahoo_api = yahoo_api or YahooFinanceAPI()
+        self.indicadores = indicadores or indicadores_reales
+        self.alerta_noticias = alerta_noticias
+        self.central_precios = central_precios
+        self.config = config or CLIENTE_ASYNC_CONFIG
+        self._sesion = None
+
+        logger.info(f"✅ ClienteDatosAsync inicializado ({'aiohttp' if aiohttp else 'hilos de asyncio'})")
+
+    def _get_sesion(self):
+        """Sesión aiohttp con pool por host (lazy, dentro del bucle en curso)"""
+        if self._sesion is None or self._sesion.closed:
+            self._sesion = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit_per_host=HTTP_CONFIG.get('pool_maxsize', 10))
+            )
+        return self._sesion
+
+    async def cerrar(self):
+        """Cerrar la sesión aiohttp (si existe)"""
+        if self._sesion is not None and not self._sesion.closed:
+            await self._sesion.close()
+        self._sesion = None
+
+    async def _get_json(self, url, proveedor=None, parsear=None, params=None, headers=None, timeout=10):
+        """
+        GET asíncrono que devuelve (status, json), o (status, parsear(json))
+        si se indica parsear
+
+        Si se indica proveedor, registra latencia y resultado en su salud
+        igual que YahooFinanceAPI._peticion: solo es éxito si hay datos
+        (parseados) válidos, no cualquier 200.
+        """
+        inicio = time.monotonic()
+        try:
+            if aiohttp is not None:
+                async with self._get_sesion().get(
+                    url, params=params, headers=headers,
+                    timeout=aiohttp.ClientTimeout(total=timeout)
+                ) as resp:
+                    status = resp.status
+                    data = await resp.json(content_type=None) if status == 200 else None
+            else:
+                resp = await asyncio.to_thread(
+                    transporte_http.get, url, params=params, headers=headers, timeout=timeout
+                )
+                status = resp.status_code
+                data = resp.json() if status == 200 else None
+            if parsear is not None and data is not None:
+                data = parsear(data)
+        except Exception:
+            if proveedor:
+                self.yahoo_api.salud.registrar(proveedor, time.monotonic() - inicio, exito=False)
+            raise
+
+        if proveedor:
+            self.yahoo_api.salud.registrar(proveedor, time.monotonic() - inicio, exito=status == 200 and bool(data))
+        return status, data
+
+    # =========================
+    # PRECIOS
+    # =========================
+    async def _obtener_precio_proveedor(self, proveedor, simbolo):
+        """Flujo común asíncrono: preparar, circuito y presupuesto, pedir y parsear"""
+        api = self.yahoo_api
+        peticion = api._preparar_peticion_precio(proveedor, simbolo)
+        if not peticion or not api._puede_consultar(proveedor):
+            return None
+
+        url, kwargs = peticion
+        try:
+            _, precio = await self._get_json(
+                url, proveedor=proveedor,
+                parsear=lambda data: api._precio_valido(api._parsear_precio(proveedor, data)),
+                **kwargs
+            )
+        except Exception as e:
+            logger.warning(f"⚠️ Error en fuente {proveedor} para {simbolo}: {e}")
+            return None
+
+        return precio
+
+    async def _obtener_precio_cubierto(self, simbolo):
+        """
+        Carrera Yahoo / Twelve Data: Twelve Data se lanza si Yahoo no
+        responde dentro de su p95; a diferencia de la versión con hilos,
+        la petición perdedora se cancela.
+        """
+        api = self.yahoo_api
+        timeout_total = api.hedging.get('timeout_total', 10)
+        inicio = time.monotonic()
+
+        pendientes = {asyncio.create_task(self._obtener_precio_proveedor('yahoo', simbolo))}
+        cubierto = simbolo not in api.td_symbols
+
+        try:
+            while pendientes:
+                espera = api._retraso_cobertura() if not cubierto else timeout_total - (time.monotonic() - inicio)
+                hechos, pendientes = await asyncio.wait(
+                    pendientes, timeout=max(0.0, espera), return_when=asyncio.FIRST_COMPLETED
+                )
+
+                for tarea in hechos:
+                    precio = tarea.result()
+                    if precio is not None:
+                        return precio
+
+                if not cubierto:
+                    cubierto = True
+                    pendientes.add(asyncio.create_task(self._obtener_precio_proveedor('twelvedata', simbolo)))
+                elif time.monotonic() - inicio >= timeout_total:
+                    break
+        finally:
+            for tarea in pendientes:
+                tarea.cancel()
+
+        return None
+
+    async def obtener_precio(self, simbolo, simbolos_sesion=None):
+        """
+        Equivalente asíncrono de YahooFinanceAPI.obtener_precio_redundante
+
+        Args:
+            simbolos_sesion: Activos de la sesión activa (se calculan si no se pasan)
+        """
+        api = self.yahoo_api
+        proveedores = ['yahoo', 'twelvedata', 'alphavantage']
+
+        if simbolos_sesion is None:
+            simbolos_sesion = api._simbolos_sesion_activa()
+
+        if api.hedging.get('habilitado') and simbolo in simbolos_sesion:
+            precio = await self._obtener_precio_cubierto(simbolo)
+            if precio is not None:
+                return precio
+            proveedores = ['alphavantage']
+
+        for proveedor in api.salud.ordenar(proveedores):
+            precio = await self._obtener_precio_proveedor(proveedor, simbolo)
+            if precio is not None:
+                return precio
+
+        return api._obtener_precio_fallback(simbolo)  # Local, siempre la última
+
+    async def _obtener_precios_proveedor_lote(self, proveedor, simbolos):
+        """Bloques multi-símbolo de un proveedor, lanzados a la vez"""
+        api = self.yahoo_api
+        peticiones = [
+            (url, kwargs, mapeados)
+            for url, kwargs, mapeados in api._preparar_peticiones_lote(proveedor, simbolos)
+            if api._puede_consultar(proveedor, api._creditos_lote(proveedor, mapeados))
+        ]
+        if not peticiones:
+            return {}
+
+        respuestas = await asyncio.gather(
+            *(
+                self._get_json(
+                    url, proveedor=proveedor,
+                    parsear=lambda data, mapeados=mapeados: api._parsear_precios_lote(proveedor, data, mapeados),
+                    **kwargs
+                )
+                for url, kwargs, mapeados in peticiones
+            ),
+            return_exceptions=True
+        )
+
+        precios = {}
+        for respuesta in respuestas:
+            if isinstance(respuesta, Exception):
+                logger.warning(f"⚠️ Error en lote {proveedor}: {respuesta}")
+                continue
+            _, lote = respuesta
+            precios.update(lote or {})
+        return precios
+
+    async def obtener_precios(self, simbolos):
+        """
+        Precios de varios símbolos: cache de la central (con
+        stale-while-revalidate, como obtener_precio_actual), lotes por
+        proveedor (en orden de salud) y, para los que falten, un gather de
+        peticiones individuales con sus fallbacks. Cada precio nuevo se
+        registra en la central al llegar, así sobrevive al deadline del ciclo.
+        """
+        precios = {}
+        pendientes = list(dict.fromkeys(simbolos))
+
+        if self.central_precios:
+            for simbolo in pendientes:
+                precio = self.central_precios.obtener_precio_cacheado(simbolo, servir_obsoleto=True)
+                if precio:
+                    precios[simbolo] = precio
+            pendientes = [s for s in pendientes if s not in precios]
+
+        for proveedor in self.yahoo_api.salud.ordenar(['yahoo', 'twelvedata']):
+            if not pendientes:
+                break
+            precios.update(self._registrar_precios(await self._obtener_precios_proveedor_lote(proveedor, pendientes)))
+            pendientes = [s for s in pendientes if s not in precios]
+
+        if pendientes:
+            simbolos_sesion = self.yahoo_api._simbolos_sesion_activa()
+            resultados = await asyncio.gather(
+                *(self._obtener_precio_registrado(s, simbolos_sesion) for s in pendientes),
+                return_exceptions=True
+            )
+            for simbolo, precio in zip(pendientes, resultados):
+                if isinstance(precio, Exception) or not precio:
+                    logger.warning(f"⚠️ No se pudo obtener precio para {simbolo}")
+                    continue
+                precios[simbolo] = precio
+
+        return precios
+
+    async def _obtener_precio_registrado(self, simbolo, simbolos_sesion):
+        """obtener_precio registrando el resultado en la central (salvo si es simulado)"""
+        precio = await self.obtener_precio(simbolo, simbolos_sesion)
+        if not precio or getattr(precio, 'simulado', False):
+            return precio
+        return self._registrar_precios({simbolo: precio}).get(simbolo)
+
+    def _registrar_precios(self, precios):
+        """Registrar precios nuevos en la central (si hay)"""
+        return self.central_precios.registrar_precios(precios) if self.central_precios else precios
+
+    def _precios_en_cache(self, simbolos):
+        """Lo que la central ya tenga (fresco u obsoleto servible) de estos símbolos"""
+        if not self.central_precios:
+            return {}
+        precios = {}
+        for simbolo in dict.fromkeys(simbolos):
+            precio = self.central_precios.obtener_precio_cacheado(simbolo, servir_obsoleto=True)
+            if precio:
+                precios[simbolo] = precio
+        return precios
+
+    # =========================
+    # HISTÓRICOS
+    # =========================
+    async def obtener_datos_historicos(self, simbolo, periodo="1mo", intervalo="1h"):
+        """Equivalente asíncrono de IndicadoresReales.obtener_datos_historicos (misma cache)"""
+        try:
+            datos = self.indicadores._datos_desde_cache(simbolo, periodo, intervalo)
+            if datos is not None:
+                return datos
+
+            almacen = self.indicadores.almacen
+            if almacen.es_derivable(intervalo):
+                base = await self.obtener_datos_historicos(simbolo, periodo, almacen.intervalo_base)
+                return self.indicadores._derivar_intervalo(simbolo, periodo, intervalo, base)
+
+            peticion = self.indicadores._preparar_peticion_historica(simbolo, periodo, intervalo)
+            if not peticion:
+                return None
+
+            url, kwargs = peticion
+            status, data = await self._get_json(url, **kwargs)
+            if status == 200:
+                # Fusionar en el almacén escribe a disco (np.save + reemplazo atómico): fuera del bucle
+                return await asyncio.to_thread(
+                    self.indicadores._procesar_respuesta_historica, simbolo, periodo, intervalo, data
+                )
+
+            logger.warning(f"⚠️ Error HTTP {status} para {simbolo}")
+            return None
+
+        except Exception as e:
+            logger.error(f"❌ Error datos históricos {simbolo}: {e}")
+            return None
+
+    # =========================
+    # NOTICIAS
+    # =========================
+    async def obtener_eventos_noticias(self):
+        """
+        Equivalente asíncrono de AlertaNoticias._obtener_eventos_apify
+
+        Returns:
+            dict: Eventos; {} si la descarga se intentó y falló o no trajo
+                  eventos (el bot no debe repetirla de forma bloqueante),
+                  None solo si no hay Apify configurado
+        """
+        if not self.alerta_noticias or not self.alerta_noticias.apify_dataset_url:
+            return None
+
+        try:
+            status, data = await self._get_json(self.alerta_noticias.apify_dataset_url, timeout=20)
+            if status != 200:
+                logger.warning(f"⚠️ Apify respondió {status}")
+                return {}
+            return self.alerta_noticias._procesar_dataset_apify(data) or {}
+        except Exception as e:
+            logger.warning(f"⚠️ Error obteniendo noticias: {e}")
+            return {}
+
+    # =========================
+    # CICLO COMPLETO
+    # =========================
+    async def obtener_ciclo(self, simbolos):
+        """
+        Toda la E/S de un ciclo lanzada a la vez: precios, históricos
+        configurados de cada símbolo y calendario de noticias. Al vencer el
+        deadline del ciclo (el de la central) se cancela lo pendiente y se
+        devuelve lo terminado.
+
+        Returns:
+            dict: {'precios': {simbolo: precio},
+                   'historicos': {(simbolo, periodo, intervalo): datos},
+                   'noticias': eventos, {} si falló o None sin Apify}
+        """
+        inicio = time.monotonic()
+        claves_historicos = [
+            (simbolo, periodo, intervalo)
+            for simbolo in dict.fromkeys(simbolos)
+            for periodo, intervalo in self.config.get('historicos', [])
+        ]
+
+        deadline = (
+            self.central_precios.deadline_ciclo if self.central_precios
+            else self.config.get('deadline_ciclo', 20)
+        )
+        tarea_precios = asyncio.create_task(self.obtener_precios(simbolos))
+        tarea_noticias = asyncio.create_task(self.obtener_eventos_noticias())
+        tareas_historicos = [
+            asyncio.create_task(self.obtener_datos_historicos(*clave)) for clave in claves_historicos
+        ]
+
+        try:
+            _, pendientes = await asyncio.wait(
+                [tarea_precios, tarea_noticias, *tareas_historicos], timeout=deadline
+            )
+            for tarea in pendientes:
+                tarea.cancel()
+            if pendientes:
+                await asyncio.gather(*pendientes, return_exceptions=True)
+                logger.warning(
+                    f"⏱️ Deadline de {deadline}s vencido en el ciclo asíncrono, "
+                    f"resultados parciales ({len(pendientes)} tareas sin terminar)"
+                )
+        finally:
+            await self.cerrar()
+
+        # Si los precios no terminaron, lo ya registrado en la central por lotes y peticiones
+        precios = self._resultado(tarea_precios)
+        if precios is None:
+            precios = self._precios_en_cache(simbolos)
+        noticias = self._resultado(tarea_noticias, {})  # Intentadas: sin reintento bloqueante
+        historicos = [self._resultado(tarea) for tarea in tareas_historicos]
+
+        logger.info(
+            f"⚡ Ciclo asíncrono: {len(precios)} precios, {len(claves_historicos)} históricos "
+            f"en {time.monotonic() - inicio:.2f}s"
+        )
+
+        return {
+            'precios': precios,
+            'historicos': dict(zip(claves_historicos, historicos)),
+            'noticias': noticias
+        }
+
+    @staticmethod
+    def _resultado(tarea, defecto=None):
+        """Resultado de una tarea terminada; defecto si se canceló o falló"""
+        if tarea.cancelled() or not tarea.done() or tarea.exception() is not None:
+            return defecto
+        return tarea.result()
+
+    def ejecutar_ciclo(self, simbolos):
+        """Punto de entrada síncrono para el bot (bucle de eventos propio por ciclo)"""
+        return asyncio.run(self.obtener_ciclo(simbolos))
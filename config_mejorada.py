@@ -1,6 +1,9 @@
 # config_mejorada.py - CONFIGURACIÓN EXPANDIDA CON MEJORAS
 import os
 
+# 📁 Directorio de datos persistentes (estado de ratelimits, caches en disco)
+DATA_DIR = os.environ.get('DATA_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'datos'))
+
 # Configuración Telegram
 TELEGRAM_TOKEN = os.environ.get('TELEGRAM_TOKEN')
 TELEGRAM_CHAT_ID = os.environ.get('TELEGRAM_CHAT_ID')
@@ -91,9 +94,9 @@ RISK_MANAGEMENT = {
 
 # 🔧 CONFIGURACIÓN APIs GRATUITAS
 FREE_APIS_CONFIG = {
-    'yahoo': {'enabled': True, 'requests_per_day': 800},
-    'twelvedata': {'enabled': True, 'requests_per_day': 800, 'api_key': 'demo'},
-    'alphavantage': {'enabled': True, 'requests_per_day': 25, 'api_key': 'demo'},
+    'yahoo': {'enabled': True, 'requests_per_day': 800, 'requests_per_minute': 60},
+    'twelvedata': {'enabled': True, 'requests_per_day': 800, 'requests_per_minute': 8, 'api_key': 'demo'},
+    'alphavantage': {'enabled': True, 'requests_per_day': 25, 'requests_per_minute': 5, 'api_key': 'demo'},
     'cache_ttl': {
         'precios': 60,      # 1 minuto
         'indicadores': 300, # 5 minutos
@@ -101,6 +104,72 @@ FREE_APIS_CONFIG = {
     }
 }
 
+# 📡 FEED DE PRECIOS EN SEGUNDO PLANO
+FEED_PRECIOS_CONFIG = {
+    'habilitado': True,
+    'intervalo_segundos': 20,      # Cadencia mínima de cada símbolo (se alarga si no llega el presupuesto diario)
+    'intervalos_por_simbolo': {},  # Ej: {'XAUUSD': 10}
+    'capacidad_cola': 100          # Por suscriptor; al llenarse se descarta lo más antiguo
+}
+
+# 📥 PRECARGA DE HISTÓRICOS AL ARRANCAR (TOP_PARES + activos de sesión)
+PRECARGA_CONFIG = {
+    'habilitado': True,
+    'historicos': [('6mo', '4h')],  # 6mo del intervalo base cubre también 1mo/1h
+    'max_workers': 4,               # Descargas simultáneas
+    'presupuesto_peticiones': 40,   # Máximo de descargas en la precarga
+    'timeout_segundos': 60          # Espera máxima antes del primer ciclo
+}
+
+# 🗃️ CACHE DE HISTÓRICOS DE IndicadoresReales (LRU acotada en memoria)
+CACHE_INDICADORES_CONFIG = {
+    'max_bytes': 64 * 1024 * 1024,  # Al superarlo se expulsa lo menos usado
+    'ttl_segundos': 300,
+    'intervalo_barrido': 60         # Segundos entre barridos de caducadas
+}
+
+# ⚡ CLIENTE ASÍNCRONO (toda la E/S del ciclo en una sola ráfaga)
+CLIENTE_ASYNC_CONFIG = {
+    'habilitado': True,
+    'historicos': [('6mo', '4h')]  # (periodo, intervalo) a precargar; 6mo de la base cubre también 1mo/1h
+}
+
+# 🕯️ ALMACÉN DE VELAS (persistente en disco para reinicios en caliente)
+ALMACEN_VELAS_CONFIG = {
+    'persistir': True,
+    'directorio': os.path.join(DATA_DIR, 'velas'),
+    'max_velas': 5000,       # Por (símbolo, intervalo)
+    'intervalo_base': '1h'   # Único intervalo descargado; 2h, 4h, 1d... se derivan localmente
+}
+
+# 🩺 SALUD DE FUENTES DE PRECIOS (circuit breaker por proveedor)
+SALUD_FUENTES_CONFIG = {
+    'ventana': 20,                # Últimas llamadas consideradas
+    'min_muestras': 5,            # Mínimo para poder abrir el circuito
+    'umbral_error': 0.5,          # Tasa de error que abre el circuito
+    'enfriamiento_segundos': 60   # Tiempo abierto antes de permitir un sondeo
+}
+
+# 🏁 PETICIONES CUBIERTAS (activos de la sesión activa en MARKET_SESSIONS)
+HEDGING_CONFIG = {
+    'habilitado': True,
+    'retraso_defecto': 1.5,  # Segundos antes de cubrir si aún no hay p95 de Yahoo
+    'retraso_minimo': 0.2,   # Nunca cubrir antes de esto
+    'timeout_total': 10,     # Segundos máximos de la carrera
+    'max_workers': 8
+}
+
+# 🌐 TRANSPORTE HTTP COMPARTIDO (conexiones keep-alive por host)
+HTTP_CONFIG = {
+    'pool_connections': 10,   # Pools de conexiones por sesión
+    'pool_maxsize': 10,       # Conexiones simultáneas por host
+    'timeout_conexion': 3.05, # Segundos
+    'timeout_lectura': 10,    # Segundos (si el llamador no indica timeout)
+    'reintentos': 2,          # Solo errores de conexión (la petición no llegó a salir)
+    'reintentos_lectura': 2,  # Timeouts de lectura y 5xx, solo con reintentar=True
+    'backoff_factor': 0.3     # 0.3s, 0.6s, ...
+}
+
 # 🕒 CONFIGURACIÓN SESIONES MERCADO
 MARKET_SESSIONS = {
     'ASIA': {'inicio': 0, 'fin': 8, 'activos': ['USDJPY', 'AUDUSD', 'NZDUSD', 'XAUUSD']},
@@ -1,8 +1,11 @@
 # detector_movimientos.py - DETECTOR DE MOVIMIENTOS PORCENTUALES SIGNIFICATIVOS
 import numpy as np
+from bisect import bisect_right
 from datetime import datetime, timedelta
 import logging
 
+from registro_simbolos import registro_simbolos
+
 logger = logging.getLogger(__name__)
 
 class DetectorMovimientos:
@@ -29,17 +32,8 @@ class DetectorMovimientos:
         logger.info("✅ Detector de Movimientos inicializado")
 
     def clasificar_tipo_activo(self, par):
-        """Clasificar el tipo de activo para aplicar umbral correcto"""
-        if any(metal in par for metal in ['XAU', 'XAG', 'XPT', 'XPD']):
-            return 'commodities'
-        elif any(energia in par for energia in ['OIL', 'NGAS']):
-            return 'commodities'
-        elif any(indice in par for indice in ['SPX', 'NAS', 'DJI', 'GER', 'UK', 'JPN']):
-            return 'indices'
-        elif any(metal in par for metal in ['COPPER']):
-            return 'commodities'
-        else:
-            return 'forex'
+        """Clasificar el tipo de activo para aplicar umbral correcto (precalculado en el registro)"""
+        return registro_simbolos.obtener(par).tipo_movimiento
 
     def obtener_umbral_activo(self, par):
         """Obtener umbral específico para el par"""
@@ -89,16 +83,16 @@ class DetectorMovimientos:
             return
             
         cutoff = datetime.now() - timedelta(hours=horas_maximas)
-        historial_limpio = [
-            dato for dato in self.historico[par] 
-            if dato['timestamp'] > cutoff
-        ]
+        historial = self.historico[par]
+        
+        # El historial está ordenado por tiempo: basta con recortar el principio
+        eliminados = 0
+        while eliminados < len(historial) and historial[eliminados]['timestamp'] <= cutoff:
+            eliminados += 1
         
-        eliminados = len(self.historico[par]) - len(historial_limpio)
         if eliminados > 0:
+            del historial[:eliminados]
             logger.debug(f"🧹 Limpiados {eliminados} datos antiguos de {par}")
-        
-        self.historico[par] = historial_limpio
 
     def _detectar_movimientos_significativos(self, par):
         """
@@ -113,17 +107,22 @@ class DetectorMovimientos:
         alertas = []
         umbral = self.obtener_umbral_activo(par)
 
-        # MOVIMIENTO 1 HORA (últimos 12 registros si hay datos de 5min)
-        if len(precios) >= 12:
-            movimiento_1h = self._calcular_movimiento_periodo(precios, -12, -1)
+        # Ventanas por tiempo: válidas con cualquier cadencia de precios
+        # (ciclo de 3 minutos o feed en segundo plano)
+        inicio_1h = self._indice_inicio_ventana(timestamps, horas=1)
+        inicio_4h = self._indice_inicio_ventana(timestamps, horas=4)
+
+        # MOVIMIENTO 1 HORA
+        if inicio_1h is not None:
+            movimiento_1h = self._calcular_movimiento_periodo(precios, inicio_1h, -1)
             if movimiento_1h and abs(movimiento_1h['porcentaje']) >= umbral:
                 alerta = self._crear_alerta_movimiento(par, movimiento_1h, '1HORA')
                 if alerta and self._es_movimiento_nuevo(alerta):
                     alertas.append(alerta)
 
-        # MOVIMIENTO 4 HORAS (últimos 48 registros)
-        if len(precios) >= 48:
-            movimiento_4h = self._calcular_movimiento_periodo(precios, -48, -1)
+        # MOVIMIENTO 4 HORAS
+        if inicio_4h is not None:
+            movimiento_4h = self._calcular_movimiento_periodo(precios, inicio_4h, -1)
             if movimiento_4h and abs(movimiento_4h['porcentaje']) >= umbral:
                 alerta = self._crear_alerta_movimiento(par, movimiento_4h, '4HORAS')
                 if alerta and self._es_movimiento_nuevo(alerta):
@@ -139,6 +138,16 @@ class DetectorMovimientos:
 
         return alertas if alertas else None
 
+    def _indice_inicio_ventana(self, timestamps, horas):
+        """
+        Índice del último registro en o antes del inicio de la ventana
+        None si el historial todavía no cubre la ventana completa
+        """
+        inicio = timestamps[-1] - timedelta(hours=horas)
+        if timestamps[0] > inicio:
+            return None
+        return bisect_right(timestamps, inicio) - 1
+
     def _calcular_movimiento_periodo(self, precios, inicio_idx, fin_idx):
         """
         Calcular movimiento porcentual en un período específico
@@ -1,39 +1,80 @@
 # analisis_tecnico_corregido.py - CON DETECCIÓN REAL DE S/R MEJORADA
+import time
 import numpy as np
 import random
 from datetime import datetime, timedelta
 import logging
 
+from indicadores_reales import IndicadoresReales
+from almacen_velas import INTERVALOS_SEGUNDOS
+from indice_sr import IndiceSR
+from registro_simbolos import registro_simbolos
+from series_indicadores import agrupar_niveles, detectar_pivots
+
 logger = logging.getLogger(__name__)
 
 class AnalisisTechnicoSR:
     def __init__(self):
         self.niveles_sr_historicos = {}
         self.indicadores = IndicadoresReales()
+        self.intervalo_sr = "4h"
+        self.estadisticas_sr = {
+            'reutilizados': 0,          # Niveles del índice sin tocar datos
+            'recalculos_vela': 0,       # Nueva vela 4h cerrada
+            'recalculos_ruptura': 0     # Precio fuera de la envolvente de niveles
+        }
         
     def detectar_niveles_sr(self, par, datos_precios):
         """Detectar niveles de Support/Resistance REALES"""
         return self.detectar_niveles_sr_reales(par)
         
-    def detectar_niveles_sr_reales(self, par):
-        """Detectar niveles S/R REALES basados en datos históricos - VERSIÓN MEJORADA"""
+    def detectar_niveles_sr_reales(self, par, precio_actual=None):
+        """
+        Detectar niveles S/R REALES basados en datos históricos - VERSIÓN MEJORADA
+        
+        Dirigido por eventos: solo se vuelve a detectar cuando cierra una vela
+        4h o el precio sale de la envolvente de niveles; entre tanto se
+        consultan los niveles del índice guardado (sin E/S ni detección).
+        """
+        return self._detectar_niveles_sr_con_indice(par, precio_actual)[0]
+    
+    def _detectar_niveles_sr_con_indice(self, par, precio_actual=None):
+        """
+        (niveles, entrada del histórico) de detectar_niveles_sr_reales; la
+        entrada es None si los niveles son los base (sin índice que los respalde)
+        """
         try:
+            entrada = self.niveles_sr_historicos.get(par)
+            if entrada and not self._requiere_recalculo_sr(par, entrada, precio_actual):
+                self.estadisticas_sr['reutilizados'] += 1
+                return self._niveles_desde_indice(entrada, precio_actual), entrada
+            
             # Obtener más datos históricos para mejor detección
-            datos = self.indicadores.obtener_datos_historicos(par, "6mo", "4h")
+            datos = self.indicadores.obtener_datos_historicos(par, "6mo", self.intervalo_sr)
             
             if not datos or len(datos['close']) < 50:
                 logger.warning(f"⚠️ Datos insuficientes para S/R real de {par}")
-                return self._niveles_sr_base(par)
-            
-            highs = np.array([h for h in datos['high'] if h is not None])
-            lows = np.array([l for l in datos['low'] if l is not None])
-            closes = np.array([c for c in datos['close'] if c is not None])
-            
-            if len(highs) < 50 or len(lows) < 50:
-                return self._niveles_sr_base(par)
-            
-            # PRECIO ACTUAL para contexto
-            precio_actual = closes[-1] if len(closes) > 0 else self._get_precio_actual(par)
+                return self._niveles_sr_base(par), None
+            
+            # Columnas alineadas del frame de velas (vistas, sin huecos)
+            highs = datos['high']
+            lows = datos['low']
+            closes = datos['close']
+            
+            # PRECIO DE LAS VELAS para contexto (el precio en vivo solo se usa en las consultas)
+            precio_datos = closes[-1] if len(closes) > 0 else self._get_precio_actual(par)
+            
+            # Reutilizar el índice si las velas no han cambiado desde la última detección
+            version = (int(datos['timestamp'][-1]), float(closes[-1]), float(highs[-1]), float(lows[-1]))
+            if entrada and entrada['indice'].version == version:
+                # Velas aún sin refrescar (cache o mercado cerrado): mismos niveles,
+                # envolvente centrada en el precio y siguiente cierre 4h a partir de ahora
+                paso = INTERVALOS_SEGUNDOS[self.intervalo_sr]
+                entrada['cierre_vela'] = version[0] + (int(time.time() - version[0]) // paso + 1) * paso
+                niveles = self._niveles_desde_indice(entrada, precio_actual)
+                if precio_actual is not None:
+                    entrada['envolvente'] = self._envolvente(niveles, precio_actual)
+                return niveles, entrada
             
             # 🎯 DETECCIÓN MEJORADA DE S/R CON MÚLTIPLOS MÉTODOS
             
@@ -46,81 +87,94 @@ class AnalisisTechnicoSR:
             supports_recent = self._detectar_minimos_recientes(lows, window=50)
             
             # 3. NIVELES PSICOLÓGICOS
-            niveles_psicologicos = self._detectar_niveles_psicologicos(precio_actual, par)
+            niveles_psicologicos = self._detectar_niveles_psicologicos(precio_datos, par)
             
-            # COMBINAR TODOS LOS MÉTODOS
-            todas_resistances = list(set(resistances_pivots + resistances_recent + niveles_psicologicos['resistance']))
-            todas_supports = list(set(supports_pivots + supports_recent + niveles_psicologicos['support']))
+            # COMBINAR TODOS LOS MÉTODOS (fuerza = métodos que producen el nivel)
+            todas_resistances = self._contar_metodos(resistances_pivots, resistances_recent, niveles_psicologicos['resistance'])
+            todas_supports = self._contar_metodos(supports_pivots, supports_recent, niveles_psicologicos['support'])
             
-            # FILTRAR Y ORDENAR NIVELES RELEVANTES
-            resistances_relevantes = self._filtrar_niveles_relevantes(todas_resistances, precio_actual, "RESISTANCE")
-            supports_relevantes = self._filtrar_niveles_relevantes(todas_supports, precio_actual, "SUPPORT")
+            # ÍNDICE ORDENADO: solo se reconstruye si cambian los niveles candidatos (pivotes nuevos)
+            firma = (tuple(sorted(todas_supports)), tuple(sorted(todas_resistances)))
+            if entrada and entrada['indice'].firma == firma:
+                indice = entrada['indice']
+            else:
+                indice = IndiceSR(
+                    todas_supports, todas_resistances, highs, lows,
+                    tolerancia=float(np.mean(closes)) * 0.003,  # Misma tolerancia que los pivotes
+                    firma=firma
+                )
+            indice.version = version
             
-            niveles = {
-                'support': supports_relevantes[:3],  # Top 3 supports
-                'resistance': resistances_relevantes[:3]  # Top 3 resistances
-            }
+            # FILTRAR Y ORDENAR NIVELES RELEVANTES (bisección sobre el índice)
+            niveles = indice.niveles_relevantes(float(precio_datos))  # Top 3 supports / resistances
             
             logger.info(f"🏔️ {par} - S/R DETECTADOS: Support {[round(s, 4) for s in niveles['support']]}, Resistance {[round(r, 4) for r in niveles['resistance']]}")
             
-            # Guardar en histórico
+            # Guardar en histórico (índice consultado por analizar_estructura_mercado)
             self.niveles_sr_historicos[par] = {
                 'niveles': niveles,
+                'indice': indice,
                 'timestamp': datetime.now(),
-                'precio_actual': precio_actual
+                'precio_actual': precio_datos,
+                'cierre_vela': version[0] + INTERVALOS_SEGUNDOS[self.intervalo_sr],  # Fin de la vela 4h en curso
+                'envolvente': self._envolvente(niveles, precio_datos)
             }
             
-            return niveles
+            entrada = self.niveles_sr_historicos[par]
+            return self._niveles_desde_indice(entrada, precio_actual), entrada
             
         except Exception as e:
             logger.error(f"❌ Error detectando S/R reales {par}: {e}")
-            return self._niveles_sr_base(par)
+            return self._niveles_sr_base(par), None
+    
+    def _requiere_recalculo_sr(self, par, entrada, precio_actual):
+        """Nueva vela 4h cerrada o precio fuera de la envolvente de niveles"""
+        if time.time() >= entrada['cierre_vela']:
+            self.estadisticas_sr['recalculos_vela'] += 1
+            logger.debug(f"🕯️ {par}: nueva vela {self.intervalo_sr} cerrada, recalculando S/R")
+            return True
+        
+        inferior, superior = entrada['envolvente']
+        if precio_actual is not None and not inferior <= precio_actual <= superior:
+            self.estadisticas_sr['recalculos_ruptura'] += 1
+            logger.debug(f"💥 {par}: precio {precio_actual} fuera de la envolvente S/R, recalculando")
+            return True
+        
+        return False
+    
+    def _envolvente(self, niveles, precio):
+        """(soporte más bajo, resistencia más alta); sin niveles, el límite del filtro (5%)"""
+        return (
+            min(niveles['support'], default=precio * 0.95),
+            max(niveles['resistance'], default=precio * 1.05)
+        )
+    
+    def _niveles_desde_indice(self, entrada, precio_actual):
+        """Niveles relevantes para el precio dado (bisección) o los de la última detección"""
+        if precio_actual is None:
+            return entrada['niveles']
+        return entrada['indice'].niveles_relevantes(float(precio_actual))
+    
+    def _nivel_mas_cercano(self, niveles, precio):
+        """[nivel más cercano al precio] de una lista corta sin índice (niveles base), o []"""
+        validos = [n for n in niveles if n and n > 0]
+        return [min(validos, key=lambda n: abs(precio - n))] if validos else []
     
     def _detectar_pivots_mejorado(self, prices, window=7, is_high=True):
-        """Detección MEJORADA de puntos pivote"""
+        """Detección MEJORADA de puntos pivote (vectorizada con ventanas deslizantes)"""
         try:
             if len(prices) < window * 2 + 1:
                 return []
             
-            pivots = []
-            
-            for i in range(window, len(prices) - window):
-                if prices[i] is None:
-                    continue
-                    
-                # Ventana izquierda y derecha
-                left_window = prices[i-window:i]
-                right_window = prices[i+1:i+window+1]
-                
-                # Filtrar valores None
-                left_window = [p for p in left_window if p is not None]
-                right_window = [p for p in right_window if p is not None]
-                
-                if not left_window or not right_window:
-                    continue
-                
-                if is_high:
-                    # Pivot high: mayor que izquierda Y derecha
-                    if (prices[i] > max(left_window) and 
-                        prices[i] > max(right_window)):
-                        pivots.append(prices[i])
-                else:
-                    # Pivot low: menor que izquierda Y derecha  
-                    if (prices[i] < min(left_window) and 
-                        prices[i] < min(right_window)):
-                        pivots.append(prices[i])
+            # None -> NaN: las ventanas ignoran los huecos
+            prices = np.array(prices, dtype=np.float64)
+            indices = detectar_pivots(prices, window=window, is_high=is_high)
             
             # Eliminar duplicados cercanos con tolerancia dinámica
-            if pivots:
-                avg_price = np.mean(prices)
+            if len(indices):
+                avg_price = np.nanmean(prices)
                 tolerance = avg_price * 0.003  # 0.3% de tolerancia
-                
-                pivots_unicos = []
-                for pivot in sorted(pivots):
-                    if not pivots_unicos or abs(pivot - pivots_unicos[-1]) > tolerance:
-                        pivots_unicos.append(pivot)
-                
-                return pivots_unicos
+                return agrupar_niveles(prices[indices], tolerance)
             
             return []
             
@@ -128,6 +182,14 @@ class AnalisisTechnicoSR:
             logger.error(f"❌ Error en detección pivotes: {e}")
             return []
     
+    def _contar_metodos(self, *listas_niveles):
+        """{nivel: número de métodos de detección que lo producen}"""
+        fuerza = {}
+        for niveles in listas_niveles:
+            for nivel in set(float(n) for n in niveles):
+                fuerza[nivel] = fuerza.get(nivel, 0) + 1
+        return fuerza
+    
     def _detectar_maximos_recientes(self, highs, window=50):
         """Detectar máximos recientes significativos"""
         try:
@@ -161,14 +223,15 @@ class AnalisisTechnicoSR:
     def _detectar_niveles_psicologicos(self, precio_actual, par):
         """Detectar niveles psicológicos basados en el precio actual"""
         try:
-            # Determinar el paso según el tipo de par
-            if par in ["XAUUSD", "XAGUSD", "XPTUSD"]:
+            # Determinar el paso según el tipo de par (precalculado en el registro)
+            grupo = registro_simbolos.obtener(par).grupo_psicologico
+            if grupo == 'metal':
                 # Metales: múltiplos de 10, 50, 100
                 step = 10.0 if precio_actual > 1000 else 5.0
-            elif par in ["OILUSD", "NGASUSD"]:
+            elif grupo == 'energia':
                 # Energía: múltiplos de 1, 5
                 step = 5.0 if precio_actual > 50 else 1.0
-            elif any(indice in par for indice in ["SPX", "NAS", "DJI"]):
+            elif grupo == 'indice':
                 # Índices: múltiplos de 100, 500
                 step = 500.0 if precio_actual > 10000 else 100.0
             else:
@@ -189,41 +252,6 @@ class AnalisisTechnicoSR:
             logger.error(f"❌ Error niveles psicológicos: {e}")
             return {'support': [], 'resistance': []}
     
-    def _filtrar_niveles_relevantes(self, niveles, precio_actual, tipo):
-        """Filtrar niveles relevantes basados en proximidad al precio actual"""
-        try:
-            if not niveles:
-                return []
-            
-            # Calcular distancias
-            niveles_con_distancia = []
-            for nivel in niveles:
-                if nivel and nivel > 0:
-                    distancia = abs((nivel - precio_actual) / precio_actual) * 100
-                    niveles_con_distancia.append((nivel, distancia))
-            
-            # Filtrar por distancia máxima según tipo
-            if tipo == "SUPPORT":
-                # Supports: solo niveles por debajo del precio actual
-                niveles_filtrados = [n for n, d in niveles_con_distancia 
-                                   if n < precio_actual and d < 5.0]  # Máximo 5% de distancia
-            else:  # RESISTANCE
-                # Resistances: solo niveles por encima del precio actual  
-                niveles_filtrados = [n for n, d in niveles_con_distancia 
-                                   if n > precio_actual and d < 5.0]
-            
-            # Ordenar por proximidad al precio actual
-            if tipo == "SUPPORT":
-                niveles_filtrados.sort(reverse=True)  # Supports más altos primero
-            else:
-                niveles_filtrados.sort()  # Resistances más bajos primero
-            
-            return niveles_filtrados[:3]  # Top 3 más relevantes
-            
-        except Exception as e:
-            logger.error(f"❌ Error filtrando niveles: {e}")
-            return []
-    
     def _get_precio_actual(self, par):
         """Obtener precio actual como fallback"""
         try:
@@ -253,41 +281,44 @@ class AnalisisTechnicoSR:
         """Análisis completo de estructura de mercado S/R - VERSIÓN MEJORADA"""
         try:
             # Obtener niveles S/R REALES
-            niveles_sr = self.detectar_niveles_sr_reales(par)
+            # Entrada solo si esta llamada produjo o validó el índice (no con niveles base)
+            niveles_sr, entrada = self._detectar_niveles_sr_con_indice(par, precio_actual)
             
             if not niveles_sr:
                 logger.warning(f"⚠️ No se pudieron obtener niveles S/R para {par}")
                 return self._analisis_fallback(par, precio_actual, rsi)
             
-            # Determinar proximidad a niveles clave
-            distancias_support = [abs(precio_actual - s) for s in niveles_sr['support'] if s and s > 0]
-            distancias_resistance = [abs(precio_actual - r) for r in niveles_sr['resistance'] if r and r > 0]
+            # Nivel más cercano a cada lado: consulta por bisección al índice
+            # si hay detección real, si no entre los niveles devueltos
+            if entrada:
+                supports = entrada['indice'].soportes_debajo(precio_actual, 1)
+                resistances = entrada['indice'].resistencias_encima(precio_actual, 1)
+            else:
+                supports = self._nivel_mas_cercano(niveles_sr['support'], precio_actual)
+                resistances = self._nivel_mas_cercano(niveles_sr['resistance'], precio_actual)
             
-            if not distancias_support or not distancias_resistance:
+            if not supports or not resistances:
                 return self._analisis_fallback(par, precio_actual, rsi)
             
-            distancia_support = min(distancias_support)
-            distancia_resistance = min(distancias_resistance)
+            support_cercano, resistance_cercana = supports[0], resistances[0]
+            distancia_support = abs(precio_actual - support_cercano)
+            distancia_resistance = abs(precio_actual - resistance_cercana)
             
-            # Determinar umbral según tipo de activo
-            if par in ['XAUUSD', 'XAGUSD', 'XPTUSD']:  # Metales
-                umbral_proximidad = precio_actual * 0.008  # 0.8%
-            elif par in ['OILUSD', 'NGASUSD']:  # Energía
-                umbral_proximidad = precio_actual * 0.012  # 1.2%
-            elif any(indice in par for indice in ['SPX', 'NAS', 'DJI']):  # Índices
-                umbral_proximidad = precio_actual * 0.015  # 1.5%
-            else:  # Forex
-                umbral_proximidad = precio_actual * 0.004  # 0.4%
+            # Determinar umbral según tipo de activo (0.8% metales, 1.2% energía, 1.5% índices, 0.4% forex)
+            umbral_proximidad = precio_actual * registro_simbolos.obtener(par).umbral_proximidad
             
             # 🎯 ESTRATEGIA S/R MEJORADA - CONDICIONES MÁS ESTRICTAS
             
             # Zona actual
             if distancia_support < distancia_resistance:
                 zona_actual = "SUPPORT"
-                nivel_cercano = min(niveles_sr['support'], key=lambda x: abs(x - precio_actual))
+                nivel_cercano = support_cercano
             else:
                 zona_actual = "RESISTANCE" 
-                nivel_cercano = min(niveles_sr['resistance'], key=lambda x: abs(x - precio_actual))
+                nivel_cercano = resistance_cercana
+            
+            # Toques y fuerza del nivel (solo con índice de detección real)
+            toques, fuerza = entrada['indice'].toques(nivel_cercano, zona_actual) if entrada else (0, 0)
             
             # CONDICIONES COMPRA (en support)
             condiciones_compra_alta = (
@@ -354,6 +385,8 @@ class AnalisisTechnicoSR:
                 'distancia_resistance': round(distancia_resistance, 5),
                 'zona_actual': zona_actual,
                 'nivel_cercano': round(nivel_cercano, 5),
+                'toques_nivel': toques,
+                'fuerza_nivel': fuerza,
                 'umbral_proximidad': round(umbral_proximidad, 5)
             }
             
@@ -0,0 +1,208 @@
+# feed_precios.py - FEED DE PRECIOS EN SEGUNDO PLANO CON PUBLICACIÓN/SUSCRIPCIÓN
+import time
+import logging
+from collections import deque
+from datetime import datetime
+from threading import Condition, Event, Lock, Thread
+
+from config_mejorada import FEED_PRECIOS_CONFIG
+
+logger = logging.getLogger(__name__)
+
+class Suscripcion:
+    """
+    Consumidor del feed: cola acotada que descarta la actualización más
+    antigua cuando se llena, y un hilo propio que entrega las actualizaciones
+    """
+    
+    def __init__(self, nombre, callback, capacidad, simbolos=None):
+        self.nombre = nombre
+        self.callback = callback
+        self.simbolos = set(simbolos) if simbolos else None  # None = todos
+        self.cola = deque(maxlen=capacidad)
+        self.condicion = Condition()
+        self.activa = True
+        self.entregados = 0
+        self.descartados = 0
+        
+        self.hilo = Thread(target=self._bucle_entrega, name=f"feed_{nombre}", daemon=True)
+        self.hilo.start()
+    
+    def publicar(self, actualizacion):
+        """Encolar sin bloquear al productor (drop-oldest si está llena)"""
+        if self.simbolos is not None and actualizacion['simbolo'] not in self.simbolos:
+            return
+        
+        with self.condicion:
+            if len(self.cola) == self.cola.maxlen:
+                self.descartados += 1
+            self.cola.append(actualizacion)
+            self.condicion.notify()
+    
+    def detener(self):
+        with self.condicion:
+            self.activa = False
+            self.condicion.notify()
+    
+    def _bucle_entrega(self):
+        while True:
+            with self.condicion:
+                while self.activa and not self.cola:
+                    self.condicion.wait()
+                if not self.activa:
+                    return
+                actualizacion = self.cola.popleft()
+            
+            try:
+                self.callback(actualizacion['simbolo'], actualizacion['precio'], actualizacion['timestamp'])
+                self.entregados += 1
+            except Exception as e:
+                logger.error(f"❌ Error en suscriptor {self.nombre} ({actualizacion['simbolo']}): {e}")
+
+
+class FeedPrecios:
+    """
+    Productor en segundo plano: mantiene caliente la central de precios
+    y publica cada precio nuevo a los suscriptores
+    """
+    
+    def __init__(self, central_precios, obtener_simbolos, config=None):
+        config = config or FEED_PRECIOS_CONFIG
+        
+        self.central_precios = central_precios
+        self.obtener_simbolos = obtener_simbolos  # callable -> lista de símbolos activos
+        self.intervalo = config.get('intervalo_segundos', 20)
+        self.intervalos_por_simbolo = config.get('intervalos_por_simbolo', {})
+        self.capacidad_cola = config.get('capacidad_cola', 100)
+        
+        self.suscripciones = []
+        self.proxima_actualizacion = {}  # {simbolo: time.monotonic() de la próxima}
+        self.ultima_publicada = {}       # {simbolo: datetime de la última publicación}
+        self.lock = Lock()
+        self._parar = Event()
+        self._hilo = None
+        self.ciclos = 0
+        
+        logger.info("✅ Feed de Precios inicializado")
+    
+    def suscribir(self, nombre, callback, simbolos=None):
+        """
+        Registrar consumidor: callback(simbolo, precio, timestamp)
+        
+        Args:
+            nombre (str): Identificador del consumidor
+            callback (callable): Función a llamar con cada actualización
+            simbolos (list): Limitar a estos símbolos (None = todos)
+        """
+        suscripcion = Suscripcion(nombre, callback, self.capacidad_cola, simbolos)
+        with self.lock:
+            self.suscripciones.append(suscripcion)
+        logger.info(f"📡 Suscriptor registrado en feed: {nombre}")
+        return suscripcion
+    
+    def iniciar(self):
+        if self._hilo and self._hilo.is_alive():
+            return
+        self._parar.clear()
+        self._hilo = Thread(target=self._bucle_productor, name="feed_precios", daemon=True)
+        self._hilo.start()
+        logger.info(f"📡 Feed de precios iniciado (cada {self.intervalo}s)")
+    
+    def detener(self):
+        self._parar.set()
+        with self.lock:
+            for suscripcion in self.suscripciones:
+                suscripcion.detener()
+        logger.info("🛑 Feed de precios detenido")
+    
+    def esta_activo(self):
+        return self._hilo is not None and self._hilo.is_alive() and not self._parar.is_set()
+    
+    def _bucle_productor(self):
+        while not self._parar.is_set():
+            try:
+                self._actualizar_simbolos_pendientes()
+            except Exception as e:
+                logger.error(f"❌ Error en feed de precios: {e}")
+            
+            self._parar.wait(self._segundos_hasta_proxima())
+    
+    def _actualizar_simbolos_pendientes(self):
+        """
+        Refrescar en lote los símbolos cuya cadencia ha vencido y publicar
+
+        Los que la central aún tiene frescos (dentro de cache_ttl) no se
+        piden a la red; la cadencia se alarga si el presupuesto diario de
+        Yahoo no da para la configurada. Los precios simulados no se publican.
+        """
+        ahora = time.monotonic()
+        simbolos = list(dict.fromkeys(self.obtener_simbolos()))
+        pendientes = [s for s in simbolos if self.proxima_actualizacion.get(s, 0) <= ahora]
+        if not pendientes:
+            return
+        
+        intervalo_presupuesto = self._intervalo_presupuesto(pendientes)
+        for simbolo in pendientes:
+            intervalo = self.intervalos_por_simbolo.get(simbolo, self.intervalo)
+            self.proxima_actualizacion[simbolo] = ahora + max(intervalo, intervalo_presupuesto)
+        
+        precios = {}
+        for simbolo in pendientes:
+            precio = self.central_precios.obtener_precio_cacheado(simbolo)
+            if precio:
+                precios[simbolo] = precio
+        
+        a_pedir = [s for s in pendientes if s not in precios]
+        if a_pedir:
+            precios.update(self.central_precios.obtener_precios_lote(
+                a_pedir, concurrente=True, deadline=self.intervalo, forzar_actualizacion=True
+            ))
+        self.ciclos += 1
+        
+        for simbolo, precio in precios.items():
+            if getattr(precio, 'simulado', False):
+                continue  # Fallback local, no es un precio de mercado
+            
+            actualizado = self.central_precios.ultima_actualizacion.get(simbolo)
+            if actualizado is None or actualizado == self.ultima_publicada.get(simbolo):
+                continue  # Nada nuevo (fallo de red con precio cacheado)
+            
+            self.ultima_publicada[simbolo] = actualizado
+            self._publicar({'simbolo': simbolo, 'precio': precio, 'timestamp': datetime.now()})
+    
+    def _intervalo_presupuesto(self, simbolos):
+        """Segundos mínimos entre lotes según lo que queda del presupuesto diario (0 si no se sabe)"""
+        try:
+            yahoo = self.central_precios._get_yahoo_api()
+            return yahoo.intervalo_sostenible_lote(simbolos) if yahoo else 0.0
+        except Exception as e:
+            logger.warning(f"⚠️ No se pudo calcular la cadencia por presupuesto: {e}")
+            return 0.0
+    
+    def _segundos_hasta_proxima(self):
+        if not self.proxima_actualizacion:
+            return self.intervalo
+        return max(0.5, min(self.proxima_actualizacion.values()) - time.monotonic())
+    
+    def _publicar(self, actualizacion):
+        with self.lock:
+            suscripciones = list(self.suscripciones)
+        for suscripcion in suscripciones:
+            suscripcion.publicar(actualizacion)
+    
+    def obtener_estadisticas(self):
+        """Estado del feed y de cada cola de suscriptor"""
+        with self.lock:
+            return {
+                'activo': self.esta_activo(),
+                'ciclos': self.ciclos,
+                'intervalo_segundos': self.intervalo,
+                'suscriptores': {
+                    s.nombre: {
+                        'en_cola': len(s.cola),
+                        'entregados': s.entregados,
+                        'descartados': s.descartados
+                    }
+                    for s in self.suscripciones
+                }
+            }
@@ -2,13 +2,34 @@
 import numpy as np
 from datetime import datetime
 
+from registro_simbolos import registro_simbolos
+from series_indicadores import serie_atr, serie_volatilidad
+
 class GestorVolatilidad:
     """
     Calcula y gestiona volatilidad para ajustar stops y posición sizing
     """
     
+    # Multiplicadores por nivel de volatilidad
+    MULTIPLICADORES_SL = {
+        "BAJA": 1.2,    # SL más amplio en baja volatilidad
+        "MEDIA": 1.0,   # SL normal
+        "ALTA": 0.8     # SL más ajustado en alta volatilidad
+    }
+    MULTIPLICADORES_TP = {
+        "BAJA": 0.8,    # TP más conservador en baja volatilidad
+        "MEDIA": 1.0,   # TP normal
+        "ALTA": 1.3     # TP más ambicioso en alta volatilidad
+    }
+    AJUSTES_TAMAÑO = {
+        "BAJA": 1.2,    # Tamaño normal
+        "MEDIA": 1.0,   # Tamaño normal
+        "ALTA": 0.7     # Reducir 30% en alta volatilidad
+    }
+    
     def __init__(self):
         self.historico_volatilidad = {}
+        self.analisis_cacheado = {}  # par -> (versión última vela, análisis)
     
     def calcular_atr(self, datos_ohlc, periodo=14):
         """
@@ -17,126 +38,122 @@ class GestorVolatilidad:
         if len(datos_ohlc['high']) < periodo + 1:
             return None
         
-        high = datos_ohlc['high'][-periodo:]
-        low = datos_ohlc['low'][-periodo:]
-        close = datos_ohlc['close'][-periodo-1:-1]  # Cierres anteriores
-        
-        true_ranges = []
-        for i in range(len(high)):
-            if i < len(close):
-                tr1 = high[i] - low[i]
-                tr2 = abs(high[i] - close[i])
-                tr3 = abs(low[i] - close[i])
-                true_ranges.append(max(tr1, tr2, tr3))
-            else:
-                true_ranges.append(high[i] - low[i])
-        
-        if true_ranges:
-            return sum(true_ranges) / len(true_ranges)
-        return None
+        # Solo las últimas periodo + 1 velas: una ventana de true range
+        cola = {col: datos_ohlc[col][-periodo - 1:] for col in ('high', 'low', 'close')}
+        return float(serie_atr(cola, periodo)[-1])
+    
+    def calcular_atr_serie(self, datos_ohlc, periodo=14):
+        """
+        ATR de cada vela en una pasada (idéntico a calcular_atr vela a vela)
+        """
+        return serie_atr(datos_ohlc, periodo)
     
     def calcular_volatilidad_historica(self, datos_ohlc, periodo=20):
         """
         Calcular volatilidad histórica (desviación estándar de retornos)
         """
-        if len(datos_ohlc['close']) < periodo + 1:
-            return None
-        
-        closes = [c for c in datos_ohlc['close'] if c is not None]
+        closes = np.asarray(datos_ohlc['close'], dtype=np.float64)  # Frame alineado: ya sin huecos
         if len(closes) < periodo + 1:
             return None
         
-        # Calcular retornos porcentuales
-        retornos = []
-        for i in range(1, len(closes)):
-            if closes[i-1] and closes[i] and closes[i-1] != 0:
-                retorno = (closes[i] - closes[i-1]) / closes[i-1]
-                retornos.append(retorno)
+        # Retornos porcentuales (descartando cierres a 0)
+        validos = (closes[:-1] != 0) & (closes[1:] != 0)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            retornos = ((closes[1:] - closes[:-1]) / closes[:-1])[validos]
         
         if len(retornos) >= periodo:
-            retornos_recientes = retornos[-periodo:]
-            volatilidad = np.std(retornos_recientes)
+            volatilidad = np.std(retornos[-periodo:])
             return volatilidad * 100  # Como porcentaje
         
         return None
     
-    def obtener_nivel_volatilidad(self, par, datos_ohlc):
+    def calcular_volatilidad_serie(self, datos_ohlc, periodo=20):
         """
-        Clasificar volatilidad en niveles: BAJA, MEDIA, ALTA
+        Volatilidad histórica de cada vela en una pasada
+        """
+        return serie_volatilidad(datos_ohlc['close'], periodo)
+    
+    def analizar_volatilidad(self, par, datos_ohlc):
+        """
+        ATR, volatilidad, nivel y todos los multiplicadores derivados en una
+        sola llamada, memorizada por par y versión de la última vela
+        
+        Returns:
+            dict: atr, volatilidad, nivel, multiplicador_sl, multiplicador_tp, ajuste_tamaño
         """
+        version = self._version_velas(datos_ohlc)
+        
+        if version is not None:
+            cacheado = self.analisis_cacheado.get(par)
+            if cacheado and cacheado[0] == version:
+                return cacheado[1]
+        
         atr = self.calcular_atr(datos_ohlc)
         vol_historica = self.calcular_volatilidad_historica(datos_ohlc)
         
         if not atr or not vol_historica:
-            return "MEDIA"  # Valor por defecto
-        
-        # Umbrales basados en tipo de activo
-        if par in ["EURUSD", "USDJPY", "GBPUSD"]:  # Forex mayor
-            if vol_historica < 0.4: return "BAJA"
-            elif vol_historica < 0.8: return "MEDIA"
-            else: return "ALTA"
-        
-        elif par in ["XAUUSD", "XAGUSD"]:  # Metales
-            if vol_historica < 0.8: return "BAJA"
-            elif vol_historica < 1.5: return "MEDIA"
-            else: return "ALTA"
+            nivel = "MEDIA"  # Valor por defecto
+        else:
+            # Umbrales basados en tipo de activo (forex mayor, metales, energía, por defecto)
+            umbral_bajo, umbral_alto = registro_simbolos.obtener(par).umbrales_volatilidad
+            if vol_historica < umbral_bajo: nivel = "BAJA"
+            elif vol_historica < umbral_alto: nivel = "MEDIA"
+            else: nivel = "ALTA"
+        
+        analisis = {
+            'atr': atr,
+            'volatilidad': vol_historica,
+            'nivel': nivel,
+            'multiplicador_sl': self.MULTIPLICADORES_SL.get(nivel, 1.0),
+            'multiplicador_tp': self.MULTIPLICADORES_TP.get(nivel, 1.0),
+            'ajuste_tamaño': self.AJUSTES_TAMAÑO.get(nivel, 1.0)
+        }
         
-        elif par in ["OILUSD", "NGASUSD"]:  # Energía
-            if vol_historica < 1.0: return "BAJA"
-            elif vol_historica < 2.0: return "MEDIA"
-            else: return "ALTA"
+        if version is not None:
+            self.analisis_cacheado[par] = (version, analisis)
+        return analisis
+    
+    def _version_velas(self, datos_ohlc):
+        """
+        (timestamp, intervalo, close, high, low) de la última vela, o None sin
+        timestamps. La última vela está en curso: su timestamp no cambia
+        mientras se mueven close/high/low, y el intervalo separa 1h de 4h.
+        """
+        timestamps = datos_ohlc.get('timestamp') if hasattr(datos_ohlc, 'get') else None
+        if timestamps is None or not len(timestamps):
+            return None
         
-        else:  # Por defecto
-            if vol_historica < 0.5: return "BAJA"
-            elif vol_historica < 1.0: return "MEDIA"
-            else: return "ALTA"
+        intervalo = int(timestamps[-1]) - int(timestamps[-2]) if len(timestamps) > 1 else 0
+        return (
+            int(timestamps[-1]), intervalo,
+            datos_ohlc['close'][-1], datos_ohlc['high'][-1], datos_ohlc['low'][-1]
+        )
+    
+    def obtener_nivel_volatilidad(self, par, datos_ohlc):
+        """
+        Clasificar volatilidad en niveles: BAJA, MEDIA, ALTA
+        """
+        return self.analizar_volatilidad(par, datos_ohlc)['nivel']
     
     def ajustar_stop_loss_por_volatilidad(self, par, sl_base, datos_ohlc):
         """
         Ajustar stop loss según volatilidad actual
         """
-        nivel_volatilidad = self.obtener_nivel_volatilidad(par, datos_ohlc)
-        
-        multiplicadores = {
-            "BAJA": 1.2,    # SL más amplio en baja volatilidad
-            "MEDIA": 1.0,   # SL normal
-            "ALTA": 0.8     # SL más ajustado en alta volatilidad
-        }
-        
-        multiplicador = multiplicadores.get(nivel_volatilidad, 1.0)
-        return sl_base * multiplicador
+        return sl_base * self.analizar_volatilidad(par, datos_ohlc)['multiplicador_sl']
     
     def ajustar_take_profit_por_volatilidad(self, par, tp_base, datos_ohlc):
         """
         Ajustar take profit según volatilidad actual
         """
-        nivel_volatilidad = self.obtener_nivel_volatilidad(par, datos_ohlc)
-        
-        multiplicadores = {
-            "BAJA": 0.8,    # TP más conservador en baja volatilidad
-            "MEDIA": 1.0,   # TP normal
-            "ALTA": 1.3     # TP más ambicioso en alta volatilidad
-        }
-        
-        multiplicador = multiplicadores.get(nivel_volatilidad, 1.0)
-        return tp_base * multiplicador
+        return tp_base * self.analizar_volatilidad(par, datos_ohlc)['multiplicador_tp']
     
     def calcular_tamaño_posicion_volatilidad(self, capital, riesgo_por_operacion, par, datos_ohlc):
         """
         Calcular tamaño de posición ajustado por volatilidad
         """
-        nivel_volatilidad = self.obtener_nivel_volatilidad(par, datos_ohlc)
-        
         # Reducir tamaño en alta volatilidad
-        ajustes_tamaño = {
-            "BAJA": 1.2,    # Tamaño normal
-            "MEDIA": 1.0,   # Tamaño normal
-            "ALTA": 0.7     # Reducir 30% en alta volatilidad
-        }
-        
-        ajuste = ajustes_tamaño.get(nivel_volatilidad, 1.0)
         tamaño_base = capital * riesgo_por_operacion
-        return tamaño_base * ajuste
+        return tamaño_base * self.analizar_volatilidad(par, datos_ohlc)['ajuste_tamaño']
     
     def generar_alerta_volatilidad(self, par, datos_ohlc):
         """
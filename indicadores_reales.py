@@ -1,94 +1,137 @@
 # indicadores_reales.py - CÁLCULO REAL DE INDICADORES CON PRECIO CENTRALIZADO
-import requests
+import time
 import numpy as np
-from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor, as_completed, TimeoutError as FuturesTimeoutError
 import logging
 
+from almacen_velas import FrameVelas, almacen_velas
+from cache_lru import CacheLRU
+from config_mejorada import CACHE_INDICADORES_CONFIG
+from motor_indicadores import motor_indicadores
+from registro_simbolos import registro_simbolos
+from series_indicadores import serie_bandas_bollinger, serie_media_movil, serie_rsi, serie_tendencia
+from transporte_http import transporte_http
+
 logger = logging.getLogger(__name__)
 
 class IndicadoresReales:
     def __init__(self):
         self.base_url = "https://query1.finance.yahoo.com/v8/finance/chart"
-        self.cache_datos = {}
-        self.cache_ttl = 300  # 5 minutos de cache para datos históricos
+        self.cache_ttl = CACHE_INDICADORES_CONFIG['ttl_segundos']  # 5 minutos de cache para datos históricos
+        self.cache_datos = CacheLRU(
+            CACHE_INDICADORES_CONFIG['max_bytes'],
+            self.cache_ttl,
+            CACHE_INDICADORES_CONFIG['intervalo_barrido']
+        )
+        self.almacen = almacen_velas  # Velas ya descargadas: al expirar el cache solo se pide lo nuevo
+        self.motor = motor_indicadores  # Estado incremental por símbolo: coste por tick independiente del histórico
         
         logger.info("✅ IndicadoresReales inicializado")
 
     def obtener_datos_historicos(self, simbolo, periodo="1mo", intervalo="1h"):
-        """Obtener datos históricos REALES de Yahoo Finance con cache"""
+        """
+        Obtener datos históricos REALES de Yahoo Finance con cache
+        
+        Solo se descarga el intervalo base del almacén; los intervalos
+        mayores (4h, 1d...) se remuestrean localmente a partir de él.
+        """
         try:
             # Verificar cache primero
-            cache_key = f"{simbolo}_{periodo}_{intervalo}"
-            ahora = datetime.now()
-            
-            if cache_key in self.cache_datos:
-                datos, timestamp = self.cache_datos[cache_key]
-                if (ahora - timestamp).total_seconds() < self.cache_ttl:
-                    logger.debug(f"📊 Datos desde cache: {simbolo}")
-                    return datos
+            datos = self._datos_desde_cache(simbolo, periodo, intervalo)
+            if datos is not None:
+                logger.debug(f"📊 Datos desde cache: {simbolo}")
+                return datos
+            
+            if self.almacen.es_derivable(intervalo):
+                base = self.obtener_datos_historicos(simbolo, periodo, self.almacen.intervalo_base)
+                return self._derivar_intervalo(simbolo, periodo, intervalo, base)
 
-            symbol_mapping = {
-                "EURUSD": "EURUSD=X", "USDCAD": "CAD=X", "EURCHF": "EURCHF=X", "EURAUD": "EURAUD=X",
-                "GBPUSD": "GBPUSD=X", "USDJPY": "JPY=X", "AUDUSD": "AUDUSD=X", "NZDUSD": "NZDUSD=X",
-                "USDCHF": "CHF=X", "GBPJPY": "GBPJPY=X", "XAUUSD": "GC=F", "XAGUSD": "SI=F", 
-                "OILUSD": "CL=F", "XPTUSD": "PL=F", "XPDUSD": "PA=F", "NGASUSD": "NG=F", 
-                "COPPER": "HG=F", "SPX500": "^GSPC", "NAS100": "^IXIC", "DJI30": "^DJI",
-                "GER40": "^GDAXI", "UK100": "^FTSE", "JPN225": "^N225"
-            }
-            
-            yahoo_symbol = symbol_mapping.get(simbolo)
-            if not yahoo_symbol:
-                logger.warning(f"⚠️ Símbolo no mapeado: {simbolo}")
+            peticion = self._preparar_peticion_historica(simbolo, periodo, intervalo)
+            if not peticion:
                 return None
             
-            url = f"{self.base_url}/{yahoo_symbol}"
-            params = {
-                'range': periodo,
-                'interval': intervalo
-            }
-            
-            headers = {
-                'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
-            }
-            
-            response = requests.get(url, params=params, headers=headers, timeout=15)
+            url, kwargs = peticion
+            response = transporte_http.get(url, **kwargs)
             
             if response.status_code == 200:
-                data = response.json()
-                if 'chart' in data and 'result' in data['chart'] and data['chart']['result']:
-                    result = data['chart']['result'][0]
-                    timestamps = result.get('timestamp', [])
-                    prices = result.get('indicators', {}).get('quote', [{}])[0]
-                    
-                    # Extraer precios y limpiar None values
-                    closes = [c for c in prices.get('close', []) if c is not None]
-                    highs = [h for h in prices.get('high', []) if h is not None]
-                    lows = [l for l in prices.get('low', []) if l is not None]
-                    opens = [o for o in prices.get('open', []) if o is not None]
-                    
-                    datos = {
-                        'timestamp': timestamps,
-                        'close': closes,
-                        'high': highs,
-                        'low': lows,
-                        'open': opens
-                    }
-                    
-                    # Guardar en cache
-                    self.cache_datos[cache_key] = (datos, ahora)
-                    logger.info(f"✅ Datos históricos obtenidos: {simbolo} - {len(closes)} registros")
-                    return datos
-                else:
-                    logger.warning(f"⚠️ Sin datos en respuesta Yahoo para {simbolo}")
-            else:
-                logger.warning(f"⚠️ Error HTTP {response.status_code} para {simbolo}")
-                
+                return self._procesar_respuesta_historica(simbolo, periodo, intervalo, response.json())
+            
+            logger.warning(f"⚠️ Error HTTP {response.status_code} para {simbolo}")
             return None
             
         except Exception as e:
             logger.error(f"❌ Error datos históricos {simbolo}: {e}")
             return None
 
+    def _datos_desde_cache(self, simbolo, periodo, intervalo):
+        """
+        Datos cacheados si siguen dentro del TTL, si no None
+        
+        Tras un reinicio el cache en memoria está vacío, pero si las velas
+        en disco se descargaron hace menos del TTL se sirven sin red.
+        """
+        cache_key = f"{simbolo}_{periodo}_{intervalo}"
+        datos = self.cache_datos.obtener(cache_key)
+        if datos is not None:
+            return datos
+        
+        ahora_ts = int(time.time())
+        edad = self.almacen.edad_descarga(simbolo, intervalo, periodo, ahora_ts)
+        if edad is not None and edad < self.cache_ttl:
+            datos = self.almacen.obtener(simbolo, intervalo, periodo, ahora_ts)
+            if datos is not None:
+                self.cache_datos.guardar(cache_key, datos, edad_segundos=edad)
+            return datos
+        return None
+
+    def _preparar_peticion_historica(self, simbolo, periodo, intervalo):
+        """URL y argumentos de la petición chart de Yahoo (None si no está mapeado)"""
+        yahoo_symbol = registro_simbolos.obtener(simbolo).yahoo
+        if not yahoo_symbol:
+            logger.warning(f"⚠️ Símbolo no mapeado: {simbolo}")
+            return None
+        
+        url = f"{self.base_url}/{yahoo_symbol}"
+        # Completa la primera vez; después solo las velas nuevas desde la última guardada
+        params = self.almacen.parametros_descarga(simbolo, intervalo, periodo, int(time.time()))
+        
+        headers = {
+            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
+        }
+        
+        return url, {'params': params, 'headers': headers, 'timeout': 15}
+
+    def _procesar_respuesta_historica(self, simbolo, periodo, intervalo, data):
+        """Fusionar la respuesta chart de Yahoo en el almacén de velas y cachear el periodo pedido"""
+        if 'chart' in data and 'result' in data['chart'] and data['chart']['result']:
+            # Frame alineado (timestamp + OHLCV) sin velas incompletas
+            nuevo = FrameVelas.desde_yahoo(data['chart']['result'][0])
+            
+            ahora_ts = int(time.time())
+            self.almacen.fusionar(simbolo, intervalo, periodo, nuevo, ahora_ts)
+            datos = self.almacen.obtener(simbolo, intervalo, periodo, ahora_ts)
+            if datos is None:
+                logger.warning(f"⚠️ Sin velas almacenadas para {simbolo}")
+                return None
+            
+            # Guardar en cache
+            self.cache_datos.guardar(f"{simbolo}_{periodo}_{intervalo}", datos)
+            logger.info(f"✅ Datos históricos obtenidos: {simbolo} - {len(datos)} registros (+{len(nuevo)} descargados)")
+            return datos
+        
+        logger.warning(f"⚠️ Sin datos en respuesta Yahoo para {simbolo}")
+        return None
+
+    def _derivar_intervalo(self, simbolo, periodo, intervalo, base):
+        """Remuestrear el frame base al intervalo pedido y cachearlo"""
+        if base is None:
+            return None
+        
+        datos = self.almacen.remuestrear(base, intervalo)
+        self.cache_datos.guardar(f"{simbolo}_{periodo}_{intervalo}", datos)
+        logger.debug(f"🕯️ {simbolo} {intervalo} derivado de {self.almacen.intervalo_base}: {len(datos)} velas")
+        return datos
+
     def obtener_indicadores_reales(self, simbolo):
         """Obtener todos los indicadores REALES (método tradicional)"""
         try:
@@ -104,11 +147,12 @@ class IndicadoresReales:
             if len(precios_cierre) < 20:
                 return self._indicadores_basicos(simbolo)
             
-            # Calcular indicadores REALES
-            precio_actual = precios_cierre[-1]
-            rsi_real = self.calcular_rsi_real(precios_cierre)
-            tendencia_real = self.determinar_tendencia(precios_cierre)
-            bandas_bollinger = self.calcular_bandas_bollinger(precios_cierre)
+            # Calcular indicadores REALES (incremental: solo las velas cerradas nuevas)
+            precio_actual = float(precios_cierre[-1])
+            estado = self.motor.evaluar(simbolo, "1h", datos)
+            rsi_real = estado['rsi']
+            tendencia_real = estado['tendencia']
+            bandas_bollinger = estado['bandas_bollinger']
             
             logger.info(f"📊 {simbolo} - RSI: {rsi_real}, Tendencia: {tendencia_real}")
             
@@ -139,16 +183,14 @@ class IndicadoresReales:
             # Obtener datos históricos
             datos = self.obtener_datos_historicos(simbolo, "1mo", "1h")
             
-            if datos and len(datos['close']) > 0:
-                # Actualizar el último precio con el actual proporcionado
-                datos['close'][-1] = precio_actual
-                
-                precios_cierre = datos['close']
-                
-                if len(precios_cierre) >= 14:  # Mínimo para RSI
-                    rsi_real = self.calcular_rsi_real(precios_cierre)
-                    tendencia_real = self.determinar_tendencia(precios_cierre)
-                    bandas_bollinger = self.calcular_bandas_bollinger(precios_cierre)
+            if datos and len(datos['close']) >= 14:  # Mínimo para RSI
+                # What-if de la vela en curso cerrando al precio proporcionado
+                # (sin tocar el frame cacheado ni recorrer el histórico)
+                estado = self.motor.evaluar(simbolo, "1h", datos, precio_actual)
+                if estado:
+                    rsi_real = estado['rsi']
+                    tendencia_real = estado['tendencia']
+                    bandas_bollinger = estado['bandas_bollinger']
                     
                     logger.debug(f"📊 Indicadores con precio proporcionado: {simbolo} - RSI: {rsi_real}")
                     
@@ -167,14 +209,47 @@ class IndicadoresReales:
             logger.error(f"❌ Error indicadores con precio {simbolo}: {e}")
             return self._indicadores_basicos_con_precio(simbolo, precio_actual)
 
+    def calcular_indicadores_lote(self, simbolos, precios):
+        """
+        Indicadores de todos los símbolos en una sola evaluación vectorizada
+        
+        El resultado queda en el motor compartido, así que las llamadas
+        posteriores a obtener_indicadores_con_precio con el mismo precio (desde
+        cualquier instancia) lo reutilizan sin recalcular.
+        
+        Args:
+            simbolos (list): Símbolos del ciclo
+            precios (dict): {simbolo: precio actual}
+            
+        Returns:
+            LoteIndicadores o None
+        """
+        try:
+            datos_por_simbolo = {}
+            for simbolo in dict.fromkeys(simbolos):
+                if not precios.get(simbolo):
+                    continue
+                datos = self.obtener_datos_historicos(simbolo, "1mo", "1h")
+                if datos and len(datos['close']) >= 14:  # Mínimo para RSI
+                    datos_por_simbolo[simbolo] = datos
+            
+            lote = self.motor.evaluar_lote("1h", datos_por_simbolo, precios)
+            if lote:
+                logger.info(f"📊 Indicadores en lote: {len(lote)} símbolos")
+            return lote
+            
+        except Exception as e:
+            logger.error(f"❌ Error calculando indicadores en lote: {e}")
+            return None
+
     def calcular_rsi_real(self, precios, periodo=14):
         """Calcular RSI REAL con fórmula estándar"""
         try:
             if len(precios) < periodo + 1:
                 return 50  # Valor neutral si no hay suficientes datos
             
-            # Convertir a numpy array para mejor manejo
-            precios_array = np.array(precios)
+            # Vista float64 (sin copia si ya viene del frame de velas)
+            precios_array = np.asarray(precios, dtype=np.float64)
             
             # Calcular cambios de precio
             deltas = np.diff(precios_array)
@@ -224,7 +299,7 @@ class IndicadoresReales:
                 return "LATERAL"
             
             # Calcular medias móviles
-            precios_array = np.array(precios)
+            precios_array = np.asarray(precios, dtype=np.float64)
             
             ma_rapida = np.mean(precios_array[-periodo_corto:])
             ma_lenta = np.mean(precios_array[-periodo_largo:])
@@ -249,7 +324,7 @@ class IndicadoresReales:
             if len(precios) < periodo:
                 return None
             
-            precios_array = np.array(precios[-periodo:])
+            precios_array = np.asarray(precios[-periodo:], dtype=np.float64)
             
             # Calcular media móvil
             media = np.mean(precios_array)
@@ -291,6 +366,25 @@ class IndicadoresReales:
             logger.error(f"❌ Error calculando media móvil: {e}")
             return None
 
+    # =========================
+    # SERIES COMPLETAS (BACKTESTING)
+    # =========================
+    def calcular_rsi_serie(self, precios, periodo=14):
+        """RSI de cada vela en una pasada (idéntico a calcular_rsi_real vela a vela)"""
+        return serie_rsi(precios, periodo)
+
+    def determinar_tendencia_serie(self, precios, periodo_corto=10, periodo_largo=20):
+        """Tendencia de cada vela (idéntica a determinar_tendencia vela a vela)"""
+        return serie_tendencia(precios, periodo_corto, periodo_largo)
+
+    def calcular_bandas_bollinger_serie(self, precios, periodo=20, desviaciones=2):
+        """Bandas de Bollinger de cada vela como dict de arrays"""
+        return serie_bandas_bollinger(precios, periodo, desviaciones)
+
+    def calcular_media_movil_serie(self, precios, periodo):
+        """Media móvil simple de cada vela (NaN sin datos suficientes)"""
+        return serie_media_movil(precios, periodo)
+
     def calcular_soporte_resistencia(self, datos_ohlc, window=20):
         """Calcular niveles de soporte y resistencia basados en máximos/mínimos recientes"""
         try:
@@ -434,16 +528,85 @@ class IndicadoresReales:
             'fuente': 'Simulación con Precio Actual'
         }
 
+    def precargar_historicos(self, simbolos, historicos, max_workers=4, presupuesto=40, timeout=60):
+        """
+        Cargar en paralelo los históricos de varios símbolos (arranque del bot)
+        
+        Lo que ya está en cache o en el almacén (p. ej. en disco) se sirve sin
+        red y no consume presupuesto; el resto se descarga con como mucho
+        max_workers peticiones simultáneas y presupuesto peticiones en total.
+        No espera más de timeout segundos: lo que quede se completará de
+        forma perezosa en el primer ciclo.
+        
+        Args:
+            historicos: Lista de (periodo, intervalo) por símbolo
+            
+        Returns:
+            dict: Resumen de la precarga
+        """
+        inicio = time.monotonic()
+        tareas = [(s, p, i) for s in dict.fromkeys(simbolos) for p, i in historicos]
+        resumen = {
+            'total': len(tareas),
+            'desde_cache': 0,
+            'descargados': 0,
+            'fallidos': 0,
+            'sin_presupuesto': 0,
+            'sin_terminar': 0
+        }
+        
+        a_descargar = []
+        for simbolo, periodo, intervalo in tareas:
+            base = self.almacen.intervalo_base if self.almacen.es_derivable(intervalo) else intervalo
+            if not registro_simbolos.obtener(simbolo).yahoo:
+                resumen['fallidos'] += 1  # Sin ticker: no gasta presupuesto
+            elif self._datos_desde_cache(simbolo, periodo, base) is not None:
+                self.obtener_datos_historicos(simbolo, periodo, intervalo)  # Sin red: deriva del base
+                resumen['desde_cache'] += 1
+            elif len(a_descargar) < presupuesto:
+                a_descargar.append((simbolo, periodo, intervalo))
+            else:
+                resumen['sin_presupuesto'] += 1
+        
+        logger.info(f"📥 Precarga: {len(tareas)} históricos, {resumen['desde_cache']} desde cache, {len(a_descargar)} a descargar")
+        
+        if a_descargar:
+            executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="precarga")
+            futuros = {executor.submit(self.obtener_datos_historicos, *tarea): tarea for tarea in a_descargar}
+            hechas = 0
+            try:
+                for futuro in as_completed(futuros, timeout=timeout):
+                    hechas += 1
+                    simbolo, periodo, intervalo = futuros[futuro]
+                    if futuro.result() is not None:
+                        resumen['descargados'] += 1
+                    else:
+                        resumen['fallidos'] += 1
+                    logger.info(f"📥 Precarga {hechas}/{len(futuros)}: {simbolo} {periodo}/{intervalo} ({time.monotonic() - inicio:.1f}s)")
+            except FuturesTimeoutError:
+                resumen['sin_terminar'] = len(futuros) - hechas
+                logger.warning(f"⏱️ Precarga: {resumen['sin_terminar']} históricos sin terminar tras {timeout}s")
+            finally:
+                executor.shutdown(wait=False, cancel_futures=True)
+        
+        resumen['segundos'] = round(time.monotonic() - inicio, 2)
+        logger.info(f"✅ Precarga completada en {resumen['segundos']}s: {resumen}")
+        return resumen
+
     def limpiar_cache(self):
         """Limpiar cache de datos históricos"""
-        self.cache_datos = {}
+        self.cache_datos.limpiar()
+        self.motor.limpiar()
         logger.info("🧹 Cache de indicadores limpiado")
 
     def obtener_estadisticas_cache(self):
         """Obtener estadísticas del cache"""
         return {
             'items_en_cache': len(self.cache_datos),
-            'cache_ttl_segundos': self.cache_ttl
+            'cache_ttl_segundos': self.cache_ttl,
+            'cache_lru': self.cache_datos.obtener_estadisticas(),
+            'almacen_velas': self.almacen.obtener_estadisticas(),
+            'motor_indicadores': self.motor.obtener_estadisticas()
         }
 
 # Instancia global para uso fácil
@@ -0,0 +1,112 @@
+# indice_sr.py - ÍNDICE ORDENADO DE NIVELES S/R CON CONSULTAS POR BISECCIÓN
+import logging
+from bisect import bisect_left, bisect_right
+from datetime import datetime
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+class IndiceSR:
+    """
+    Niveles candidatos de soporte y resistencia de un símbolo en arrays
+    ordenados, con su fuerza (cuántos métodos de detección los produjeron)
+    y sus toques (velas cuyo rango pasó a menos de la tolerancia del nivel).
+
+    Las consultas "nivel más cercano por encima/debajo" y "niveles dentro de
+    X%" son O(log n) por bisección. Se reconstruye solo cuando cambia el
+    conjunto de niveles candidatos (p. ej. al confirmarse pivotes nuevos).
+    """
+
+    def __init__(self, soportes, resistencias, highs, lows, tolerancia, firma=None, version=None):
+        """
+        Args:
+            soportes, resistencias (dict): {nivel: fuerza}
+            highs, lows: Columnas de las velas analizadas (para los toques)
+            tolerancia (float): Distancia máxima para contar un toque
+            firma: Conjunto de niveles candidatos del que se construyó
+            version: Versión de las velas analizadas
+        """
+        self.soportes, self.fuerza_soportes = self._ordenar(soportes)
+        self.resistencias, self.fuerza_resistencias = self._ordenar(resistencias)
+        self.firma = firma
+        self.version = version
+        self.construido = datetime.now()
+
+        # Toques: velas con low <= nivel + tol y high >= nivel - tol
+        lows_ordenados = np.sort(np.asarray(lows, dtype=np.float64))
+        highs_ordenados = np.sort(np.asarray(highs, dtype=np.float64))
+        self.toques_soportes = self._contar_toques(self.soportes, lows_ordenados, highs_ordenados, tolerancia)
+        self.toques_resistencias = self._contar_toques(self.resistencias, lows_ordenados, highs_ordenados, tolerancia)
+
+        # Listas para bisect (sin conversiones en cada consulta)
+        self._soportes = self.soportes.tolist()
+        self._resistencias = self.resistencias.tolist()
+
+    @staticmethod
+    def _ordenar(niveles):
+        validos = sorted((float(nivel), fuerza) for nivel, fuerza in niveles.items() if nivel and nivel > 0)
+        return (
+            np.array([nivel for nivel, _ in validos], dtype=np.float64),
+            np.array([fuerza for _, fuerza in validos], dtype=np.int64)
+        )
+
+    @staticmethod
+    def _contar_toques(niveles, lows_ordenados, highs_ordenados, tolerancia):
+        # Las velas con high < nivel - tol son un subconjunto de las de low <= nivel + tol
+        return (
+            np.searchsorted(lows_ordenados, niveles + tolerancia, side='right')
+            - np.searchsorted(highs_ordenados, niveles - tolerancia, side='left')
+        )
+
+    def __len__(self):
+        return len(self._soportes) + len(self._resistencias)
+
+    # =========================
+    # CONSULTAS
+    # =========================
+    def soportes_debajo(self, precio, n=3, max_distancia_pct=5.0):
+        """Hasta n soportes estrictamente por debajo del precio y a menos de max_distancia_pct, el más alto primero"""
+        niveles = []
+        for i in range(bisect_left(self._soportes, precio) - 1, -1, -1):
+            nivel = self._soportes[i]
+            if len(niveles) >= n or not abs((nivel - precio) / precio) * 100 < max_distancia_pct:
+                break
+            niveles.append(nivel)
+        return niveles
+
+    def resistencias_encima(self, precio, n=3, max_distancia_pct=5.0):
+        """Hasta n resistencias estrictamente por encima del precio y a menos de max_distancia_pct, la más baja primero"""
+        niveles = []
+        for i in range(bisect_right(self._resistencias, precio), len(self._resistencias)):
+            nivel = self._resistencias[i]
+            if len(niveles) >= n or not abs((nivel - precio) / precio) * 100 < max_distancia_pct:
+                break
+            niveles.append(nivel)
+        return niveles
+
+    def niveles_relevantes(self, precio, n=3):
+        """{'support': [...], 'resistance': [...]} más cercanos al precio"""
+        return {
+            'support': self.soportes_debajo(precio, n),
+            'resistance': self.resistencias_encima(precio, n)
+        }
+
+    def niveles_en_rango(self, precio, porcentaje):
+        """Soportes y resistencias a menos de porcentaje % del precio (dos cortes por bisección)"""
+        margen = abs(precio) * porcentaje / 100
+        return {
+            'support': self._soportes[bisect_left(self._soportes, precio - margen):bisect_right(self._soportes, precio + margen)],
+            'resistance': self._resistencias[bisect_left(self._resistencias, precio - margen):bisect_right(self._resistencias, precio + margen)]
+        }
+
+    def toques(self, nivel, tipo="SUPPORT"):
+        """Toques y fuerza de un nivel del índice, o (0, 0) si no está"""
+        niveles, toques, fuerza = (
+            (self._soportes, self.toques_soportes, self.fuerza_soportes) if tipo == "SUPPORT"
+            else (self._resistencias, self.toques_resistencias, self.fuerza_resistencias)
+        )
+        i = bisect_left(niveles, nivel)
+        if i < len(niveles) and niveles[i] == nivel:
+            return int(toques[i]), int(fuerza[i])
+        return 0, 0
@@ -0,0 +1,503 @@
+# motor_indicadores.py - MOTOR INCREMENTAL DE INDICADORES (O(1) POR VELA)
+import logging
+from collections import deque
+from threading import Lock
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+class EstadoIndicadores:
+    """
+    Estado incremental de los indicadores de un símbolo
+
+    actualizar() incorpora una vela cerrada en tiempo constante:
+    - RSI de Wilder: medias suavizadas de ganancias/pérdidas
+    - Medias y Bollinger: sumas y sumas de cuadrados móviles, desplazadas
+      respecto a un valor de referencia para no perder precisión
+    - ATR: suma móvil de los true range
+
+    evaluar() calcula los mismos indicadores como si la vela en curso
+    cerrara al precio dado, sin modificar el estado (what-if).
+    """
+
+    RECALCULO_SUMAS = 1000  # Velas entre recálculos exactos de las sumas móviles
+
+    def __init__(self, periodo_rsi=14, periodo_corto=10, periodo_largo=20, periodo_atr=14, desviaciones=2):
+        self.periodo_rsi = periodo_rsi
+        self.periodo_corto = periodo_corto
+        self.periodo_largo = periodo_largo  # También ventana de Bollinger
+        self.periodo_atr = periodo_atr
+        self.desviaciones = desviaciones
+
+        self.ultimo_timestamp = None
+        self.velas = 0
+        self.cierre_anterior = None
+
+        # RSI (Wilder)
+        self.deltas = 0
+        self.suma_ganancias = 0.0
+        self.suma_perdidas = 0.0
+        self.media_ganancias = None
+        self.media_perdidas = None
+
+        # Medias móviles y Bollinger (desplazadas respecto a referencia)
+        self.referencia = None
+        self.cierres = deque(maxlen=periodo_largo)
+        self.suma_larga = 0.0
+        self.suma_cuadrados = 0.0
+        self.suma_corta = 0.0
+
+        # ATR
+        self.true_ranges = deque(maxlen=periodo_atr)
+        self.suma_tr = 0.0
+
+    # =========================
+    # ACTUALIZACIÓN (VELA CERRADA)
+    # =========================
+    def actualizar(self, close, high=None, low=None, timestamp=None):
+        """Incorporar una vela cerrada en O(1)"""
+        if self.referencia is None:
+            self.referencia = close
+
+        if self.cierre_anterior is not None:
+            self._actualizar_rsi(close - self.cierre_anterior)
+
+        if high is not None and low is not None:
+            tr = self._true_range(high, low, self.cierre_anterior)
+            if len(self.true_ranges) == self.periodo_atr:
+                self.suma_tr -= self.true_ranges[0]
+            self.true_ranges.append(tr)
+            self.suma_tr += tr
+
+        self._actualizar_sumas(close)
+
+        self.cierre_anterior = close
+        self.ultimo_timestamp = timestamp
+        self.velas += 1
+
+        if self.velas % self.RECALCULO_SUMAS == 0:
+            self._recalcular_sumas()
+
+    def _actualizar_rsi(self, delta):
+        ganancia = delta if delta > 0 else 0.0
+        perdida = -delta if delta < 0 else 0.0
+        self.deltas += 1
+
+        if self.deltas <= self.periodo_rsi:
+            self.suma_ganancias += ganancia
+            self.suma_perdidas += perdida
+            if self.deltas == self.periodo_rsi:
+                # Primer promedio simple
+                self.media_ganancias = self.suma_ganancias / self.periodo_rsi
+                self.media_perdidas = self.suma_perdidas / self.periodo_rsi
+        else:
+            self.media_ganancias, self.media_perdidas = self._suavizar(ganancia, perdida)
+
+    def _suavizar(self, ganancia, perdida):
+        p = self.periodo_rsi
+        return (
+            (self.media_ganancias * (p - 1) + ganancia) / p,
+            (self.media_perdidas * (p - 1) + perdida) / p
+        )
+
+    def _actualizar_sumas(self, close):
+        x = close - self.referencia
+        if len(self.cierres) == self.periodo_largo:
+            saliente = self.cierres[0] - self.referencia
+            self.suma_larga -= saliente
+            self.suma_cuadrados -= saliente * saliente
+        if len(self.cierres) >= self.periodo_corto:
+            self.suma_corta -= self.cierres[-self.periodo_corto] - self.referencia
+
+        self.cierres.append(close)
+        self.suma_larga += x
+        self.suma_cuadrados += x * x
+        self.suma_corta += x
+
+    def _recalcular_sumas(self):
+        """Recalcular las sumas desde la ventana para acotar el error acumulado"""
+        self.referencia = self.cierres[-1]
+        desplazados = [c - self.referencia for c in self.cierres]
+        self.suma_larga = sum(desplazados)
+        self.suma_cuadrados = sum(x * x for x in desplazados)
+        self.suma_corta = sum(desplazados[-self.periodo_corto:])
+        self.suma_tr = sum(self.true_ranges)
+
+    @staticmethod
+    def _true_range(high, low, cierre_anterior):
+        if cierre_anterior is None:
+            return high - low
+        return max(high - low, abs(high - cierre_anterior), abs(low - cierre_anterior))
+
+    # =========================
+    # EVALUACIÓN WHAT-IF (VELA EN CURSO)
+    # =========================
+    def evaluar(self, precio, high=None, low=None):
+        """
+        Indicadores si la vela en curso cerrara a precio (sin modificar el estado)
+
+        Returns:
+            dict: rsi, tendencia, bandas_bollinger y atr (None si faltan datos)
+        """
+        cierres = len(self.cierres) + 1
+        return {
+            'rsi': self._rsi_con(precio),
+            'tendencia': self._tendencia_con(precio, cierres),
+            'bandas_bollinger': self._bollinger_con(precio, cierres),
+            'atr': self._atr_con(high, low)
+        }
+
+    def _rsi_con(self, precio):
+        if self.cierre_anterior is None or self.deltas + 1 < self.periodo_rsi:
+            return 50  # Valor neutral si no hay suficientes datos
+
+        delta = precio - self.cierre_anterior
+        ganancia = delta if delta > 0 else 0.0
+        perdida = -delta if delta < 0 else 0.0
+
+        if self.deltas + 1 == self.periodo_rsi:
+            media_ganancias = (self.suma_ganancias + ganancia) / self.periodo_rsi
+            media_perdidas = (self.suma_perdidas + perdida) / self.periodo_rsi
+        else:
+            media_ganancias, media_perdidas = self._suavizar(ganancia, perdida)
+
+        rs = media_ganancias / media_perdidas if media_perdidas != 0 else float('inf')
+        rsi = 100 - (100 / (1 + rs))
+        return round(max(0, min(100, rsi)), 2)
+
+    def _sumas_con(self, precio):
+        """Sumas (larga, cuadrados, corta) de la ventana con precio como último cierre"""
+        x = precio - self.referencia
+        suma_larga = self.suma_larga + x
+        suma_cuadrados = self.suma_cuadrados + x * x
+        suma_corta = self.suma_corta + x
+        if len(self.cierres) == self.periodo_largo:
+            saliente = self.cierres[0] - self.referencia
+            suma_larga -= saliente
+            suma_cuadrados -= saliente * saliente
+        if len(self.cierres) >= self.periodo_corto:
+            suma_corta -= self.cierres[-self.periodo_corto] - self.referencia
+        return suma_larga, suma_cuadrados, suma_corta
+
+    def _tendencia_con(self, precio, cierres):
+        if self.referencia is None or cierres < self.periodo_largo:
+            return "LATERAL"
+
+        suma_larga, _, suma_corta = self._sumas_con(precio)
+        ma_rapida = suma_corta / self.periodo_corto + self.referencia
+        ma_lenta = suma_larga / self.periodo_largo + self.referencia
+
+        diferencia_porcentual = (ma_rapida - ma_lenta) / ma_lenta * 100
+        if diferencia_porcentual > 0.5:  # 0.5% de diferencia
+            return "ALCISTA"
+        elif diferencia_porcentual < -0.5:
+            return "BAJISTA"
+        return "LATERAL"
+
+    def _bollinger_con(self, precio, cierres):
+        if self.referencia is None or cierres < self.periodo_largo:
+            return None
+
+        n = self.periodo_largo
+        suma_larga, suma_cuadrados, _ = self._sumas_con(precio)
+        media_desplazada = suma_larga / n
+        varianza = max(suma_cuadrados / n - media_desplazada * media_desplazada, 0.0)
+
+        media = media_desplazada + self.referencia
+        desviacion = varianza ** 0.5
+        banda_superior = media + (self.desviaciones * desviacion)
+        banda_inferior = media - (self.desviaciones * desviacion)
+        ancho = banda_superior - banda_inferior
+
+        return {
+            'media': round(media, 5),
+            'banda_superior': round(banda_superior, 5),
+            'banda_inferior': round(banda_inferior, 5),
+            'ancho_bandas': round(ancho / media * 100, 2),
+            'posicion_actual': round((precio - banda_inferior) / ancho * 100, 1) if ancho else 50.0,
+            'desviacion': round(desviacion, 5)
+        }
+
+    def _atr_con(self, high, low):
+        if high is None or low is None:
+            # Sin vela en curso: ATR de las velas cerradas
+            return self.suma_tr / self.periodo_atr if len(self.true_ranges) == self.periodo_atr else None
+
+        tr = self._true_range(high, low, self.cierre_anterior)
+        if len(self.true_ranges) < self.periodo_atr - 1:
+            return None
+        suma = self.suma_tr + tr
+        if len(self.true_ranges) == self.periodo_atr:
+            suma -= self.true_ranges[0]
+        return suma / self.periodo_atr
+
+class LoteIndicadores:
+    """
+    Resultado de MotorIndicadores.evaluar_lote en forma struct-of-arrays:
+    la fila i de cada array corresponde a simbolos[i]. Los huecos (datos
+    insuficientes) son NaN en los arrays numéricos.
+    """
+
+    __slots__ = ('intervalo', 'simbolos', 'indice', 'precio', 'ultimo_timestamp',
+                 'rsi', 'tendencia', 'bandas_bollinger', 'atr')
+
+    def __init__(self, intervalo, simbolos, precio, ultimo_timestamp, rsi, tendencia, bandas_bollinger, atr):
+        self.intervalo = intervalo
+        self.simbolos = simbolos
+        self.indice = {simbolo: i for i, simbolo in enumerate(simbolos)}
+        self.precio = precio
+        self.ultimo_timestamp = ultimo_timestamp
+        self.rsi = rsi
+        self.tendencia = tendencia
+        self.bandas_bollinger = bandas_bollinger
+        self.atr = atr
+
+    def __len__(self):
+        return len(self.simbolos)
+
+    def __contains__(self, simbolo):
+        return simbolo in self.indice
+
+    def fila(self, simbolo):
+        """Indicadores de un símbolo con el formato de EstadoIndicadores.evaluar (o None)"""
+        i = self.indice.get(simbolo)
+        if i is None:
+            return None
+
+        bandas = None
+        if not np.isnan(self.bandas_bollinger['media'][i]):
+            bandas = {clave: float(valores[i]) for clave, valores in self.bandas_bollinger.items()}
+
+        return {
+            'rsi': float(self.rsi[i]),
+            'tendencia': str(self.tendencia[i]),
+            'bandas_bollinger': bandas,
+            'atr': None if np.isnan(self.atr[i]) else float(self.atr[i])
+        }
+
+class MotorIndicadores:
+    """
+    Estados incrementales por (símbolo, intervalo, parámetros)
+
+    Cada estado es el resultado cacheado del trabajo sobre velas cerradas,
+    versionado por el timestamp de la última vela cerrada que incorporó:
+    sincronizar() solo procesa las velas cerradas posteriores, así que ese
+    trabajo se hace una vez por vela y no una vez por ciclo. Lo único que
+    se recalcula en cada consulta es el ajuste de la vela en curso.
+    """
+
+    def __init__(self, **parametros):
+        self.parametros = parametros
+        self.estados = {}
+        self.lotes = {}  # intervalo -> último LoteIndicadores calculado
+        self.lock = Lock()
+        self.estadisticas = {
+            'aciertos': 0,          # Sin velas cerradas nuevas: cero trabajo histórico
+            'incrementales': 0,     # Velas cerradas nuevas incorporadas en O(1) cada una
+            'reconstrucciones': 0,  # Estado nuevo o historia reiniciada
+            'velas_incorporadas': 0,
+            'aciertos_lote': 0
+        }
+
+        logger.info("✅ Motor de indicadores incremental inicializado")
+
+    def _clave(self, simbolo, intervalo, parametros):
+        """(símbolo, intervalo, tupla de parámetros) y los parámetros efectivos"""
+        efectivos = {**self.parametros, **(parametros or {})}
+        return (simbolo, intervalo, tuple(sorted(efectivos.items()))), efectivos
+
+    def sincronizar(self, simbolo, intervalo, datos, parametros=None):
+        """
+        Incorporar las velas cerradas del frame (todas menos la última, en curso)
+
+        Returns:
+            EstadoIndicadores o None si no hay velas
+        """
+        timestamps = datos['timestamp']
+        if len(timestamps) == 0:
+            return None
+
+        with self.lock:
+            clave, efectivos = self._clave(simbolo, intervalo, parametros)
+            estado = self.estados.get(clave)
+            cerradas = len(timestamps) - 1
+
+            if estado is not None and estado.ultimo_timestamp is not None:
+                # Misma versión de velas cerradas: nada que incorporar
+                if cerradas and estado.ultimo_timestamp == timestamps[cerradas - 1]:
+                    self.estadisticas['aciertos'] += 1
+                    return estado
+
+                # Historia reiniciada (p. ej. descarga completa con otro origen): empezar de cero
+                if cerradas and timestamps[0] > estado.ultimo_timestamp:
+                    estado = None
+
+            if estado is None:
+                estado = self.estados[clave] = EstadoIndicadores(**efectivos)
+                inicio = 0
+                self.estadisticas['reconstrucciones'] += 1
+            else:
+                inicio = int(timestamps.searchsorted(estado.ultimo_timestamp, side='right')) if estado.ultimo_timestamp is not None else 0
+                self.estadisticas['incrementales' if inicio < cerradas else 'aciertos'] += 1
+
+            closes, highs, lows = datos['close'], datos['high'], datos['low']
+            for i in range(inicio, cerradas):
+                estado.actualizar(float(closes[i]), float(highs[i]), float(lows[i]), int(timestamps[i]))
+            self.estadisticas['velas_incorporadas'] += max(cerradas - inicio, 0)
+
+            return estado
+
+    def evaluar(self, simbolo, intervalo, datos, precio=None, parametros=None):
+        """
+        Indicadores de la vela en curso con precio (por defecto, su último cierre)
+
+        Args:
+            parametros (dict): Periodos distintos de los del motor (opcional)
+
+        Returns:
+            dict o None si no hay velas
+        """
+        estado = self.sincronizar(simbolo, intervalo, datos, parametros)
+        if estado is None:
+            return None
+
+        if precio is None:
+            precio = float(datos['close'][-1])
+
+        # Reutilizar el lote del ciclo si se calculó con el mismo precio y las mismas velas
+        lote = self.lotes.get(intervalo) if not parametros else None
+        if lote is not None and simbolo in lote:
+            i = lote.indice[simbolo]
+            if lote.precio[i] == precio and lote.ultimo_timestamp[i] == estado.ultimo_timestamp:
+                self.estadisticas['aciertos_lote'] += 1
+                return lote.fila(simbolo)
+
+        return estado.evaluar(precio, float(datos['high'][-1]), float(datos['low'][-1]))
+
+    def obtener_estadisticas(self):
+        """Estados, tasa de aciertos por versión de velas y velas incorporadas"""
+        with self.lock:
+            consultas = self.estadisticas['aciertos'] + self.estadisticas['incrementales'] + self.estadisticas['reconstrucciones']
+            return {
+                'estados': len(self.estados),
+                'tasa_aciertos': round(self.estadisticas['aciertos'] / consultas, 3) if consultas else 0.0,
+                **self.estadisticas
+            }
+
+    def evaluar_lote(self, intervalo, datos_por_simbolo, precios):
+        """
+        What-if de la vela en curso para todos los símbolos en una sola
+        pasada vectorizada: apila la ventana de cierres de cada estado más su
+        precio en una matriz (símbolos x periodo_largo) y el estado de RSI y
+        ATR en vectores. Solo la sincronización (velas nuevas) es por símbolo.
+
+        Args:
+            datos_por_simbolo (dict): {simbolo: frame de velas}
+            precios (dict): {simbolo: precio actual}
+
+        Returns:
+            LoteIndicadores (también queda guardado para evaluar())
+        """
+        filas = []
+        for simbolo, datos in datos_por_simbolo.items():
+            precio = precios.get(simbolo)
+            if not precio or datos is None:
+                continue
+            estado = self.sincronizar(simbolo, intervalo, datos)
+            if estado is not None:
+                filas.append((simbolo, estado, float(precio), float(datos['high'][-1]), float(datos['low'][-1])))
+
+        if not filas:
+            return None
+
+        simbolos = [simbolo for simbolo, *_ in filas]
+        estados = [estado for _, estado, *_ in filas]
+        precio = np.array([fila[2] for fila in filas])
+        high = np.array([fila[3] for fila in filas])
+        low = np.array([fila[4] for fila in filas])
+        e0 = estados[0]
+        n_largo, n_corto, n_rsi, n_atr = e0.periodo_largo, e0.periodo_corto, e0.periodo_rsi, e0.periodo_atr
+
+        def vector(atributo):
+            return np.array([np.nan if getattr(e, atributo) is None else getattr(e, atributo) for e in estados], dtype=np.float64)
+
+        # Matriz de cierres: últimos n_largo - 1 cerrados + precio (NaN a la izquierda si faltan)
+        cierres = np.full((len(filas), n_largo), np.nan)
+        for i, estado in enumerate(estados):
+            ultimos = list(estado.cierres)[-(n_largo - 1):]
+            if ultimos:
+                cierres[i, n_largo - 1 - len(ultimos):n_largo - 1] = ultimos
+        cierres[:, -1] = precio
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            # RSI: un paso de Wilder (o el primer promedio simple) desde el estado
+            cierre_anterior = vector('cierre_anterior')
+            deltas = np.array([e.deltas for e in estados]) + 1
+            delta = precio - cierre_anterior
+            ganancia = np.where(delta > 0, delta, 0.0)
+            perdida = np.where(delta < 0, -delta, 0.0)
+            media_ganancias = np.where(
+                deltas == n_rsi,
+                (vector('suma_ganancias') + ganancia) / n_rsi,
+                (vector('media_ganancias') * (n_rsi - 1) + ganancia) / n_rsi
+            )
+            media_perdidas = np.where(
+                deltas == n_rsi,
+                (vector('suma_perdidas') + perdida) / n_rsi,
+                (vector('media_perdidas') * (n_rsi - 1) + perdida) / n_rsi
+            )
+            rs = np.where(media_perdidas != 0, media_ganancias / media_perdidas, np.inf)
+            rsi = np.round(np.clip(100 - (100 / (1 + rs)), 0, 100), 2)
+            rsi = np.where((deltas >= n_rsi) & ~np.isnan(cierre_anterior), rsi, 50.0)
+
+            # Medias y Bollinger sobre la ventana completa (NaN si no hay n_largo cierres)
+            ma_lenta = cierres.mean(axis=1)
+            ma_rapida = cierres[:, -n_corto:].mean(axis=1)
+            diferencia_porcentual = (ma_rapida - ma_lenta) / ma_lenta * 100
+            tendencia = np.select(
+                [diferencia_porcentual > 0.5, diferencia_porcentual < -0.5],
+                ["ALCISTA", "BAJISTA"],
+                "LATERAL"
+            )
+
+            desviacion = cierres.std(axis=1)
+            banda_superior = ma_lenta + (e0.desviaciones * desviacion)
+            banda_inferior = ma_lenta - (e0.desviaciones * desviacion)
+            ancho = banda_superior - banda_inferior
+            bandas_bollinger = {
+                'media': np.round(ma_lenta, 5),
+                'banda_superior': np.round(banda_superior, 5),
+                'banda_inferior': np.round(banda_inferior, 5),
+                'ancho_bandas': np.round(ancho / ma_lenta * 100, 2),
+                'posicion_actual': np.where(ancho != 0, np.round((precio - banda_inferior) / ancho * 100, 1), 50.0),
+                'desviacion': np.round(desviacion, 5)
+            }
+            bandas_bollinger['posicion_actual'][np.isnan(ma_lenta)] = np.nan
+
+            # ATR: suma móvil de true range + la vela en curso
+            true_range = np.where(
+                np.isnan(cierre_anterior),
+                high - low,
+                np.maximum.reduce([high - low, np.abs(high - cierre_anterior), np.abs(low - cierre_anterior)])
+            )
+            n_tr = np.array([len(e.true_ranges) for e in estados])
+            saliente = np.array([e.true_ranges[0] if len(e.true_ranges) == n_atr else 0.0 for e in estados])
+            atr = np.where(n_tr >= n_atr - 1, (vector('suma_tr') + true_range - saliente) / n_atr, np.nan)
+
+        lote = LoteIndicadores(
+            intervalo, simbolos, precio,
+            [e.ultimo_timestamp for e in estados],
+            rsi, tendencia, bandas_bollinger, atr
+        )
+        with self.lock:
+            self.lotes[intervalo] = lote
+        return lote
+
+    def limpiar(self):
+        with self.lock:
+            self.estados.clear()
+            self.lotes.clear()
+
+# Instancia global: estados compartidos por todas las instancias de IndicadoresReales
+motor_indicadores = MotorIndicadores()
@@ -14,7 +14,8 @@ Si la llamada falla o no hay eventos mapeables, simplemente no se envían alerta
 
 from datetime import datetime, timedelta
 import os
-import requests
+
+from transporte_http import transporte_http
 
 
 class AlertaNoticias:
@@ -81,21 +82,26 @@ class AlertaNoticias:
     # =========================
     # MÉTODO PÚBLICO PRINCIPAL
     # =========================
-    def obtener_alertas_activas(self):
-        """Método público que usa el bot para obtener alertas recientes."""
-        return self.verificar_noticias_impacto()
+    def obtener_alertas_activas(self, eventos=None):
+        """
+        Método público que usa el bot para obtener alertas recientes.
+        Acepta eventos ya descargados (p. ej. por el cliente asíncrono).
+        """
+        return self.verificar_noticias_impacto(eventos)
 
-    def verificar_noticias_impacto(self):
+    def verificar_noticias_impacto(self, eventos=None):
         """
-        Obtiene datos desde Apify.
+        Obtiene datos desde Apify (salvo que se pasen los eventos ya obtenidos).
         Si la API falla o no hay eventos mapeables, devuelve [].
         """
         try:
-            if not self.apify_dataset_url:
-                print("⚠️ APIFY_DATASET_URL no configurado. Sin noticias.")
-                return []
+            if eventos is None:
+                if not self.apify_dataset_url:
+                    print("⚠️ APIFY_DATASET_URL no configurado. Sin noticias.")
+                    return []
+
+                eventos = self._obtener_eventos_apify()
 
-            eventos = self._obtener_eventos_apify()
             if not eventos:
                 return []
 
@@ -126,36 +132,42 @@ class AlertaNoticias:
         Se espera una lista de eventos en JSON.
         """
         try:
-            resp = requests.get(self.apify_dataset_url, timeout=20)
+            resp = transporte_http.get(self.apify_dataset_url, timeout=20, reintentar=True)  # Idempotente y sin cuota
             if resp.status_code != 200:
                 print(f"⚠️ Apify respondió {resp.status_code}: {resp.text[:200]}")
                 return None
 
-            data = resp.json()
-            if not isinstance(data, list):
-                print("⚠️ El dataset de Apify no es una lista.")
-                return None
+            return self._procesar_dataset_apify(resp.json())
 
-            eventos = {}
+        except Exception as e:
+            print(f"⚠️ Error en _obtener_eventos_apify: {e}")
+            return None
 
-            for item in data:
-                mapeo = self._mapear_evento_apify(item)
-                if not mapeo:
-                    continue
-                clave_evento, datos = mapeo
+    def _procesar_dataset_apify(self, data):
+        """
+        Reduce la lista de eventos de Apify al más reciente por tipo de evento.
+        Compartido por la versión bloqueante y la asíncrona.
+        """
+        if not isinstance(data, list):
+            print("⚠️ El dataset de Apify no es una lista.")
+            return None
 
-                # Guardamos el más reciente por tipo de evento
-                if (
-                    clave_evento not in eventos or
-                    datos["timestamp"] > eventos[clave_evento]["timestamp"]
-                ):
-                    eventos[clave_evento] = datos
+        eventos = {}
 
-            return eventos or None
+        for item in data:
+            mapeo = self._mapear_evento_apify(item)
+            if not mapeo:
+                continue
+            clave_evento, datos = mapeo
 
-        except Exception as e:
-            print(f"⚠️ Error en _obtener_eventos_apify: {e}")
-            return None
+            # Guardamos el más reciente por tipo de evento
+            if (
+                clave_evento not in eventos or
+                datos["timestamp"] > eventos[clave_evento]["timestamp"]
+            ):
+                eventos[clave_evento] = datos
+
+        return eventos or None
 
     def _mapear_evento_apify(self, item):
         """
@@ -0,0 +1,152 @@
+# registro_simbolos.py - REGISTRO CENTRAL DE SÍMBOLOS CON IDS Y METADATOS PRECALCULADOS
+import logging
+from collections import namedtuple
+from threading import Lock
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+InfoSimbolo = namedtuple('InfoSimbolo', [
+    'id',                    # Entero denso: índice en arrays por símbolo
+    'simbolo',
+    'clase',                 # forex, metal, energia, commodity, indice
+    'yahoo',                 # Ticker por proveedor (None si no lo cubre)
+    'twelvedata',
+    'alphavantage',
+    'tick',                  # Tamaño de tick / pip
+    'tipo_movimiento',       # Grupo de umbral de DetectorMovimientos
+    'umbral_proximidad',     # Fracción del precio para zonas S/R
+    'grupo_psicologico',     # Paso de niveles psicológicos en AnalisisTechnicoSR
+    'umbrales_volatilidad'   # (baja, alta) de volatilidad histórica en %
+])
+
+# simbolo: (clase, yahoo, twelvedata, alphavantage, tick)
+DEFINICIONES_SIMBOLOS = {
+    # FOREX
+    "EURUSD": ('forex', "EURUSD=X", "EUR/USD", "EURUSD", 0.0001),
+    "USDCAD": ('forex', "CAD=X", "CAD/USD", None, 0.0001),
+    "EURCHF": ('forex', "EURCHF=X", None, None, 0.0001),
+    "EURAUD": ('forex', "EURAUD=X", None, None, 0.0001),
+    "GBPUSD": ('forex', "GBPUSD=X", None, None, 0.0001),
+    "USDJPY": ('forex', "JPY=X", None, None, 0.01),
+    "AUDUSD": ('forex', "AUDUSD=X", None, None, 0.0001),
+    "NZDUSD": ('forex', "NZDUSD=X", None, None, 0.0001),
+    "USDCHF": ('forex', "CHF=X", None, None, 0.0001),
+    "GBPJPY": ('forex', "GBPJPY=X", None, None, 0.01),
+
+    # MATERIAS PRIMAS
+    "XAUUSD": ('metal', "GC=F", "XAU/USD", "XAUUSD", 0.01),
+    "XAGUSD": ('metal', "SI=F", None, None, 0.001),
+    "XPTUSD": ('metal', "PL=F", None, None, 0.01),
+    "XPDUSD": ('metal', "PA=F", None, None, 0.01),
+    "OILUSD": ('energia', "CL=F", None, None, 0.01),
+    "NGASUSD": ('energia', "NG=F", None, None, 0.001),
+    "COPPER": ('commodity', "HG=F", None, None, 0.0005),
+
+    # ACCIONES/ÍNDICES
+    "SPX500": ('indice', "^GSPC", "SPX", "SPX", 0.01),
+    "NAS100": ('indice', "^IXIC", "NAS100", None, 0.01),
+    "DJI30": ('indice', "^DJI", None, None, 0.01),
+    "GER40": ('indice', "^GDAXI", None, None, 0.01),
+    "UK100": ('indice', "^FTSE", None, None, 0.01),
+    "JPN225": ('indice', "^N225", None, None, 0.01),
+}
+
+# Reglas históricas de cada módulo, evaluadas una sola vez por símbolo
+
+def _tipo_movimiento(simbolo):
+    if any(s in simbolo for s in ['XAU', 'XAG', 'XPT', 'XPD', 'OIL', 'NGAS', 'COPPER']):
+        return 'commodities'
+    if any(s in simbolo for s in ['SPX', 'NAS', 'DJI', 'GER', 'UK', 'JPN']):
+        return 'indices'
+    return 'forex'
+
+def _grupo_psicologico(simbolo):
+    if simbolo in ["XAUUSD", "XAGUSD", "XPTUSD"]:
+        return 'metal'
+    if simbolo in ["OILUSD", "NGASUSD"]:
+        return 'energia'
+    if any(s in simbolo for s in ["SPX", "NAS", "DJI"]):
+        return 'indice'
+    return 'forex'
+
+UMBRALES_PROXIMIDAD = {'metal': 0.008, 'energia': 0.012, 'indice': 0.015, 'forex': 0.004}
+
+def _umbrales_volatilidad(simbolo):
+    if simbolo in ["EURUSD", "USDJPY", "GBPUSD"]:  # Forex mayor
+        return (0.4, 0.8)
+    if simbolo in ["XAUUSD", "XAGUSD"]:  # Metales
+        return (0.8, 1.5)
+    if simbolo in ["OILUSD", "NGASUSD"]:  # Energía
+        return (1.0, 2.0)
+    return (0.5, 1.0)
+
+class RegistroSimbolos:
+    """
+    Registro único de símbolos: cada uno recibe un ID entero denso y sus
+    metadatos (tickers por proveedor, clase, tick y umbrales) se calculan
+    una sola vez. Los símbolos desconocidos se registran al pedirlos, con
+    las mismas reglas y sin tickers.
+    """
+
+    def __init__(self, definiciones=None):
+        self.info = {}
+        self.simbolos = []  # simbolos[id] -> símbolo
+        self.lock = Lock()
+
+        for simbolo, definicion in (definiciones or DEFINICIONES_SIMBOLOS).items():
+            self._registrar(simbolo, *definicion)
+
+        logger.info(f"✅ Registro de símbolos: {len(self.simbolos)} símbolos")
+
+    def _registrar(self, simbolo, clase='forex', yahoo=None, twelvedata=None, alphavantage=None, tick=0.0001):
+        grupo = _grupo_psicologico(simbolo)
+        info = InfoSimbolo(
+            id=len(self.simbolos),
+            simbolo=simbolo,
+            clase=clase,
+            yahoo=yahoo,
+            twelvedata=twelvedata,
+            alphavantage=alphavantage,
+            tick=tick,
+            tipo_movimiento=_tipo_movimiento(simbolo),
+            umbral_proximidad=UMBRALES_PROXIMIDAD[grupo],
+            grupo_psicologico=grupo,
+            umbrales_volatilidad=_umbrales_volatilidad(simbolo)
+        )
+        self.info[simbolo] = info
+        self.simbolos.append(simbolo)
+        return info
+
+    def obtener(self, simbolo):
+        """InfoSimbolo del símbolo (lo registra si es nuevo)"""
+        info = self.info.get(simbolo)
+        if info is None:
+            with self.lock:
+                info = self.info.get(simbolo) or self._registrar(simbolo)
+        return info
+
+    def id_de(self, simbolo):
+        return self.obtener(simbolo).id
+
+    def tickers(self, proveedor):
+        """{simbolo: ticker} de un proveedor ('yahoo', 'twelvedata', 'alphavantage')"""
+        return {
+            simbolo: getattr(info, proveedor)
+            for simbolo, info in self.info.items()
+            if getattr(info, proveedor)
+        }
+
+    def columna(self, campo, dtype=np.float64):
+        """Array indexado por ID con un campo de todos los símbolos registrados"""
+        return np.array([getattr(self.info[s], campo) for s in self.simbolos], dtype=dtype)
+
+    def __len__(self):
+        return len(self.simbolos)
+
+    def __contains__(self, simbolo):
+        return simbolo in self.info
+
+# Instancia global: los IDs son del proceso y los comparten todos los módulos
+registro_simbolos = RegistroSimbolos()
@@ -0,0 +1,236 @@
+# series_indicadores.py - SERIES COMPLETAS DE INDICADORES (VECTORIZADAS)
+"""
+Contrapartes de serie de los indicadores escalares: cada función devuelve
+un array de la misma longitud que la entrada, donde la posición i es lo que
+devolvería la versión escalar con los datos hasta la vela i incluida.
+
+Pensado para investigación y backtesting: una pasada por símbolo en lugar
+de una llamada por vela. Los resultados son idénticos bit a bit a los de
+IndicadoresReales y GestorVolatilidad (mismo orden de operaciones en coma
+flotante), así que las señales de un backtest coinciden con las del bot.
+"""
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+def _ventanas(valores, periodo):
+    """Vista (n - periodo + 1, periodo) de ventanas deslizantes, sin copia"""
+    return sliding_window_view(np.asarray(valores, dtype=np.float64), periodo)
+
+def _rellenar(resultado, n, relleno=np.nan):
+    """Anteponer relleno hasta longitud n (posiciones sin datos suficientes)"""
+    salida = np.full(n, relleno, dtype=resultado.dtype if resultado.size else np.float64)
+    if resultado.size:
+        salida[n - len(resultado):] = resultado
+    return salida
+
+def _suma_secuencial(ventanas):
+    """Suma por filas en el mismo orden que sum() de Python (columna a columna)"""
+    total = ventanas[:, 0].copy()
+    for j in range(1, ventanas.shape[1]):
+        total += ventanas[:, j]
+    return total
+
+def serie_media_movil(precios, periodo):
+    """Media móvil simple; NaN donde calcular_media_movil devolvería None"""
+    n = len(precios)
+    if n < periodo:
+        return np.full(n, np.nan)
+    return _rellenar(_ventanas(precios, periodo).mean(axis=1), n)
+
+def serie_rsi(precios, periodo=14):
+    """
+    RSI de Wilder redondeado a 2 decimales; 50 en las primeras periodo velas
+
+    El suavizado de Wilder es una recursión (cada media depende de la
+    anterior): se aplica en una sola pasada lineal sobre las ganancias y
+    pérdidas ya vectorizadas, con la misma aritmética que calcular_rsi_real.
+    """
+    precios_array = np.asarray(precios, dtype=np.float64)
+    n = len(precios_array)
+    rsi = np.full(n, 50.0)
+    if n < periodo + 1:
+        return rsi
+
+    deltas = np.diff(precios_array)
+    gains = np.where(deltas > 0, deltas, 0)
+    losses = np.where(deltas < 0, -deltas, 0)
+
+    medias_ganancias = np.empty(n - periodo)
+    medias_perdidas = np.empty(n - periodo)
+    avg_gain = np.mean(gains[:periodo])
+    avg_loss = np.mean(losses[:periodo])
+    medias_ganancias[0] = avg_gain
+    medias_perdidas[0] = avg_loss
+
+    for k, (gain, loss) in enumerate(zip(gains[periodo:].tolist(), losses[periodo:].tolist()), 1):
+        avg_gain = (avg_gain * (periodo - 1) + gain) / periodo
+        avg_loss = (avg_loss * (periodo - 1) + loss) / periodo
+        medias_ganancias[k] = avg_gain
+        medias_perdidas[k] = avg_loss
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        rs = np.where(medias_perdidas != 0, medias_ganancias / medias_perdidas, np.inf)
+    valores = np.clip(100 - (100 / (1 + rs)), 0, 100)
+
+    rsi[periodo:] = np.round(valores, 2)
+    return rsi
+
+def serie_tendencia(precios, periodo_corto=10, periodo_largo=20):
+    """Array de "ALCISTA" / "BAJISTA" / "LATERAL" (cruce de medias, umbral 0.5%)"""
+    n = len(precios)
+    tendencia = np.full(n, "LATERAL", dtype='<U7')
+    if n < periodo_largo:
+        return tendencia
+
+    ma_rapida = serie_media_movil(precios, periodo_corto)[periodo_largo - 1:]
+    ma_lenta = serie_media_movil(precios, periodo_largo)[periodo_largo - 1:]
+    diferencia_porcentual = (ma_rapida - ma_lenta) / ma_lenta * 100
+
+    tendencia[periodo_largo - 1:] = np.select(
+        [diferencia_porcentual > 0.5, diferencia_porcentual < -0.5],
+        ["ALCISTA", "BAJISTA"],
+        "LATERAL"
+    )
+    return tendencia
+
+def serie_bandas_bollinger(precios, periodo=20, desviaciones=2):
+    """
+    Bandas de Bollinger por vela, con las claves y el redondeo de
+    calcular_bandas_bollinger; NaN donde esta devolvería None
+
+    Returns:
+        dict: {clave: array}
+    """
+    n = len(precios)
+    claves = ('media', 'banda_superior', 'banda_inferior', 'ancho_bandas', 'posicion_actual', 'desviacion')
+    if n < periodo:
+        return {clave: np.full(n, np.nan) for clave in claves}
+
+    ventanas = _ventanas(precios, periodo)
+    media = ventanas.mean(axis=1)
+    desviacion = ventanas.std(axis=1)
+
+    banda_superior = media + (desviaciones * desviacion)
+    banda_inferior = media - (desviaciones * desviacion)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        ancho_bandas = (banda_superior - banda_inferior) / media * 100
+        posicion_bandas = (ventanas[:, -1] - banda_inferior) / (banda_superior - banda_inferior) * 100
+
+    return {
+        'media': _rellenar(np.round(media, 5), n),
+        'banda_superior': _rellenar(np.round(banda_superior, 5), n),
+        'banda_inferior': _rellenar(np.round(banda_inferior, 5), n),
+        'ancho_bandas': _rellenar(np.round(ancho_bandas, 2), n),
+        'posicion_actual': _rellenar(np.round(posicion_bandas, 1), n),
+        'desviacion': _rellenar(np.round(desviacion, 5), n)
+    }
+
+def serie_true_range(high, low, close):
+    """True range por vela; la primera, sin cierre anterior, es high - low"""
+    high = np.asarray(high, dtype=np.float64)
+    low = np.asarray(low, dtype=np.float64)
+    close = np.asarray(close, dtype=np.float64)
+
+    true_range = high - low
+    if len(true_range) > 1:
+        cierre_anterior = close[:-1]
+        true_range[1:] = np.maximum.reduce([
+            true_range[1:],
+            np.abs(high[1:] - cierre_anterior),
+            np.abs(low[1:] - cierre_anterior)
+        ])
+    return true_range
+
+def serie_atr(datos_ohlc, periodo=14):
+    """
+    ATR (media simple de los últimos periodo true range) por vela;
+    NaN donde GestorVolatilidad.calcular_atr devolvería None
+    """
+    n = len(datos_ohlc['high'])
+    if n < periodo + 1:
+        return np.full(n, np.nan)
+
+    true_range = serie_true_range(datos_ohlc['high'], datos_ohlc['low'], datos_ohlc['close'])
+    atr = _suma_secuencial(_ventanas(true_range[1:], periodo)) / periodo
+    return _rellenar(atr, n)
+
+def detectar_pivots(precios, window=7, is_high=True):
+    """
+    Índices de los pivotes: velas estrictamente por encima (is_high) o por
+    debajo de todos los valores no-NaN de las window velas a cada lado.
+    Las ventanas sin ningún valor válido no generan pivote.
+    """
+    precios = np.asarray(precios, dtype=np.float64)
+    n = len(precios)
+    if n < window * 2 + 1:
+        return np.empty(0, dtype=np.intp)
+
+    # Máximo/mínimo móvil ignorando NaN (NaN solo si toda la ventana lo es)
+    reducir = np.fmax if is_high else np.fmin
+    extremos = reducir.reduce(_ventanas(precios, window), axis=1)
+
+    centro = precios[window:n - window]
+    izquierda = extremos[:n - 2 * window]   # precios[i-window:i]
+    derecha = extremos[window + 1:]         # precios[i+1:i+window+1]
+
+    # Comparaciones con NaN son falsas: centro o ventana vacía quedan fuera
+    if is_high:
+        es_pivot = (centro > izquierda) & (centro > derecha)
+    else:
+        es_pivot = (centro < izquierda) & (centro < derecha)
+
+    return np.flatnonzero(es_pivot) + window
+
+def agrupar_niveles(niveles, tolerancia):
+    """
+    Niveles ordenados sin duplicados cercanos: se conserva un nivel si dista
+    más de tolerancia del último conservado. Cada salto se localiza con
+    búsqueda binaria, así que el coste es O(k log n) para k niveles únicos.
+    """
+    ordenados = np.sort(np.asarray(niveles, dtype=np.float64))
+    n = len(ordenados)
+    if n == 0:
+        return []
+
+    unicos = [ordenados[0]]
+    j = 0
+    while True:
+        ultimo = unicos[-1]
+        # Aproximación con searchsorted y ajuste con el criterio exacto (a - ultimo > tolerancia)
+        j = max(int(np.searchsorted(ordenados, ultimo + tolerancia, side='right')), j + 1)
+        while j > 1 and ordenados[j - 1] > ultimo and ordenados[j - 1] - ultimo > tolerancia:
+            j -= 1
+        while j < n and not ordenados[j] - ultimo > tolerancia:
+            j += 1
+        if j >= n:
+            break
+        unicos.append(ordenados[j])
+
+    return [float(nivel) for nivel in unicos]
+
+def serie_volatilidad(closes, periodo=20):
+    """
+    Volatilidad histórica (desviación de retornos porcentuales, en %) por
+    vela; NaN donde GestorVolatilidad.calcular_volatilidad_historica
+    devolvería None. Como allí, se descartan los retornos con un cierre a 0.
+    """
+    closes = np.asarray(closes, dtype=np.float64)
+    n = len(closes)
+    volatilidad = np.full(n, np.nan)
+    if n < periodo + 1:
+        return volatilidad
+
+    validos = (closes[:-1] != 0) & (closes[1:] != 0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        retornos = ((closes[1:] - closes[:-1]) / closes[:-1])[validos]
+    if len(retornos) < periodo:
+        return volatilidad
+
+    desviaciones = _ventanas(retornos, periodo).std(axis=1) * 100
+
+    # Retornos válidos acumulados hasta cada vela: la vela k usa los últimos periodo
+    acumulados = np.concatenate(([0], np.cumsum(validos)))
+    con_datos = (acumulados >= periodo) & (np.arange(n) >= periodo)
+    volatilidad[con_datos] = desviaciones[acumulados[con_datos] - periodo]
+    return volatilidad
@@ -0,0 +1,146 @@
+# transporte_http.py - TRANSPORTE HTTP COMPARTIDO CON CONEXIONES PERSISTENTES
+import time
+import logging
+from threading import Lock
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from config_mejorada import HTTP_CONFIG
+
+logger = logging.getLogger(__name__)
+
+class TransporteHTTP:
+    """
+    Capa HTTP única para todas las llamadas salientes
+    Una sesión keep-alive por host, reintentos con backoff y latencias por host
+
+    Por defecto solo se reintentan los errores de conexión: un timeout de
+    lectura o un 5xx se devuelve enseguida para que circuitos, p95 y hedging
+    vean la latencia real y no se gaste cuota fuera de los rate limiters.
+    Las llamadas idempotentes sin cuota (Apify...) pueden pedir reintentos
+    completos con reintentar=True.
+    """
+    
+    def __init__(self, config=None):
+        config = config or HTTP_CONFIG
+        
+        self.pool_connections = config.get('pool_connections', 10)
+        self.pool_maxsize = config.get('pool_maxsize', 10)
+        self.timeout = (config.get('timeout_conexion', 3.05), config.get('timeout_lectura', 10))
+        self.reintentos = config.get('reintentos', 2)
+        self.reintentos_lectura = config.get('reintentos_lectura', 2)
+        self.backoff_factor = config.get('backoff_factor', 0.3)
+        
+        self.sesiones = {}
+        self.estadisticas = {}
+        self.lock = Lock()
+        
+        logger.info("✅ Transporte HTTP inicializado")
+
+    def _crear_sesion(self, reintentar=False):
+        """Sesión con pool de conexiones y política de reintentos (lectura/estado solo si reintentar)"""
+        reintentos_lectura = self.reintentos_lectura if reintentar else 0
+        reintentos = Retry(
+            total=self.reintentos + reintentos_lectura,
+            connect=self.reintentos,
+            read=reintentos_lectura,
+            status=reintentos_lectura,
+            backoff_factor=self.backoff_factor,
+            status_forcelist=(500, 502, 503, 504) if reintentar else (),
+            allowed_methods=frozenset(["GET", "HEAD"]),  # POST no se reintenta tras enviarse
+            raise_on_status=False
+        )
+        adaptador = HTTPAdapter(
+            pool_connections=self.pool_connections,
+            pool_maxsize=self.pool_maxsize,
+            max_retries=reintentos
+        )
+        
+        sesion = requests.Session()
+        sesion.mount("https://", adaptador)
+        sesion.mount("http://", adaptador)
+        return sesion
+
+    def _get_sesion(self, host, reintentar=False):
+        """Obtener la sesión del host (lazy loading)"""
+        with self.lock:
+            sesion = self.sesiones.get((host, reintentar))
+            if sesion is None:
+                sesion = self._crear_sesion(reintentar)
+                self.sesiones[(host, reintentar)] = sesion
+            if host not in self.estadisticas:
+                self.estadisticas[host] = {
+                    'peticiones': 0,
+                    'errores': 0,
+                    'latencia_total': 0.0,
+                    'latencia_max': 0.0,
+                    'latencia_ultima': 0.0
+                }
+            return sesion
+
+    def _registrar_latencia(self, host, latencia, error):
+        """Acumular contadores de latencia del host"""
+        with self.lock:
+            stats = self.estadisticas[host]
+            stats['peticiones'] += 1
+            stats['latencia_total'] += latencia
+            stats['latencia_ultima'] = latencia
+            stats['latencia_max'] = max(stats['latencia_max'], latencia)
+            if error:
+                stats['errores'] += 1
+
+    def request(self, metodo, url, reintentar=False, **kwargs):
+        """
+        Petición HTTP por la sesión persistente del host
+
+        Args:
+            reintentar (bool): Reintentar también timeouts de lectura y 5xx
+                (solo para llamadas idempotentes que no consumen cuota)
+        """
+        kwargs.setdefault('timeout', self.timeout)
+        host = urlsplit(url).netloc
+        sesion = self._get_sesion(host, reintentar)
+        
+        inicio = time.monotonic()
+        try:
+            resp = sesion.request(metodo, url, **kwargs)
+        except Exception:
+            self._registrar_latencia(host, time.monotonic() - inicio, error=True)
+            raise
+        
+        self._registrar_latencia(host, time.monotonic() - inicio, error=resp.status_code >= 500)
+        return resp
+
+    def get(self, url, **kwargs):
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.request("POST", url, **kwargs)
+
+    def obtener_estadisticas(self):
+        """Latencias por host (segundos)"""
+        with self.lock:
+            resumen = {}
+            for host, stats in self.estadisticas.items():
+                peticiones = stats['peticiones']
+                resumen[host] = {
+                    'peticiones': peticiones,
+                    'errores': stats['errores'],
+                    'latencia_media': round(stats['latencia_total'] / peticiones, 4) if peticiones else 0.0,
+                    'latencia_max': round(stats['latencia_max'], 4),
+                    'latencia_ultima': round(stats['latencia_ultima'], 4)
+                }
+            return resumen
+
+    def cerrar(self):
+        """Cerrar todas las sesiones abiertas"""
+        with self.lock:
+            for sesion in self.sesiones.values():
+                sesion.close()
+            self.sesiones = {}
+
+# Instancia global compartida por todos los módulos
+transporte_http = TransporteHTTP()
@@ -1,7 +1,25 @@
 # yahoo_api_mejorado.py - CON MÚLTIPLES FUENTES GRATUITAS
-import requests
+import os
+import json
 import time
-from datetime import datetime
+import atexit
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from datetime import datetime, timedelta
+from threading import Lock
+
+from config_mejorada import (
+    FREE_APIS_CONFIG, DATA_DIR, SALUD_FUENTES_CONFIG, HEDGING_CONFIG, MARKET_SESSIONS
+)
+from registro_simbolos import registro_simbolos
+from transporte_http import transporte_http
+
+class PrecioSimulado(float):
+    """
+    Precio del fallback local, no de mercado: se comporta como float pero
+    queda marcado para que nadie lo cachee ni lo publique como real
+    """
+    simulado = True
 
 class YahooFinanceAPI:
     """
@@ -10,40 +28,50 @@ class YahooFinanceAPI:
 
     def __init__(self):
         self.base_url = "https://query1.finance.yahoo.com/v8/finance/chart"
-        self.rate_limiter = RateLimiter()
-        
-        # Mapeo interno de símbolos
-        self.symbol_mapping = {
-            # FOREX
-            "EURUSD": "EURUSD=X", "USDCAD": "CAD=X", "EURCHF": "EURCHF=X", "EURAUD": "EURAUD=X",
-            "GBPUSD": "GBPUSD=X", "USDJPY": "JPY=X", "AUDUSD": "AUDUSD=X", "NZDUSD": "NZDUSD=X",
-            "USDCHF": "CHF=X", "GBPJPY": "GBPJPY=X",
-
-            # MATERIAS PRIMAS
-            "XAUUSD": "GC=F", "XAGUSD": "SI=F", "OILUSD": "CL=F", "XPTUSD": "PL=F",
-            "XPDUSD": "PA=F", "NGASUSD": "NG=F", "COPPER": "HG=F",
-
-            # ACCIONES/ÍNDICES
-            "SPX500": "^GSPC", "NAS100": "^IXIC", "DJI30": "^DJI",
-            "GER40": "^GDAXI", "UK100": "^FTSE", "JPN225": "^N225",
-        }
+        self.spark_url = "https://query1.finance.yahoo.com/v7/finance/spark"
+        self.twelvedata_url = "https://api.twelvedata.com/price"
+        self.max_simbolos_lote = 20  # Límite de símbolos por petición spark
+        self.rate_limiter = rate_limiter  # Compartido por todas las instancias
+        self.salud = salud_fuentes        # Salud por fuente (latencias + circuit breaker)
+        
+        # Peticiones cubiertas (Yahoo + Twelve Data en carrera) para activos de la sesión
+        self.hedging = HEDGING_CONFIG
+        self._executor = None
+        self._lock_executor = Lock()
+        
+        # Mapeos de símbolos por proveedor (registro central)
+        # Alpha Vantage solo cubre los principales para conservar sus 25 req/día
+        self.symbol_mapping = registro_simbolos.tickers('yahoo')
+        self.td_symbols = registro_simbolos.tickers('twelvedata')
+        self.av_symbols = registro_simbolos.tickers('alphavantage')
 
     def obtener_precio_redundante(self, simbolo: str):
         """
         Obtener precio de múltiples fuentes gratuitas
+        
+        Cada fuente consume su propio presupuesto justo antes de la llamada
+        de red; si su cubo está vacío devuelve None y se pasa a la siguiente.
+        Las fuentes de red se prueban de la más rápida a la más lenta entre
+        las sanas; las que tienen el circuito abierto se saltan sin esperar.
         """
-        fuentes = [
-            self._obtener_precio_yahoo,
-            self._obtener_precio_twelvedata,
-            self._obtener_precio_alphavantage,
-            self._obtener_precio_fallback
-        ]
+        fuentes_red = {
+            'yahoo': self._obtener_precio_yahoo,
+            'twelvedata': self._obtener_precio_twelvedata,
+            'alphavantage': self._obtener_precio_alphavantage
+        }
+        
+        # Activos de la sesión: carrera Yahoo / Twelve Data para recortar la cola de latencia
+        if self.hedging.get('habilitado') and simbolo in self._simbolos_sesion_activa():
+            precio = self.obtener_precio_cubierto(simbolo)
+            if precio is not None:
+                return precio
+            fuentes_red.pop('yahoo')
+            fuentes_red.pop('twelvedata')
+        
+        fuentes = [fuentes_red[p] for p in self.salud.ordenar(list(fuentes_red))]
+        fuentes.append(self._obtener_precio_fallback)  # Local, siempre la última
         
         for fuente in fuentes:
-            if not self.rate_limiter.puede_llamar_api():
-                time.sleep(1)
-                continue
-                
             try:
                 precio = fuente(simbolo)
                 if precio is not None:
@@ -55,22 +83,190 @@ class YahooFinanceAPI:
         print(f"❌ Todas las fuentes fallaron para {simbolo}")
         return None
 
-    def _obtener_precio_yahoo(self, simbolo: str):
-        """Fuente principal - Yahoo Finance"""
+    def obtener_precio_cubierto(self, simbolo: str):
+        """
+        Petición cubierta: lanza Yahoo y, si no responde dentro de su p95,
+        lanza también Twelve Data. Gana el primer precio válido; la petición
+        perdedora no se puede abortar y su resultado se ignora.
+        """
+        executor = self._get_executor()
+        retraso = self._retraso_cobertura()
+        timeout_total = self.hedging.get('timeout_total', 10)
+        inicio = time.monotonic()
+        
+        futuros = {executor.submit(self._obtener_precio_yahoo, simbolo): 'yahoo'}
+        cubierto = simbolo not in self.td_symbols  # Sin mapeo Twelve Data no hay cobertura
+        
+        while futuros:
+            espera = retraso if not cubierto else timeout_total - (time.monotonic() - inicio)
+            hechos, _ = wait(futuros, timeout=max(0.0, espera), return_when=FIRST_COMPLETED)
+            
+            for futuro in hechos:
+                fuente = futuros.pop(futuro)
+                try:
+                    precio = futuro.result()
+                except Exception as e:
+                    print(f"⚠️ Error en fuente cubierta {fuente}: {e}")
+                    precio = None
+                if precio is not None and precio > 0:
+                    return precio
+            
+            if not cubierto:
+                # Yahoo tarda más que su p95 (o ya falló): lanzar Twelve Data
+                cubierto = True
+                futuros[executor.submit(self._obtener_precio_twelvedata, simbolo)] = 'twelvedata'
+            elif time.monotonic() - inicio >= timeout_total:
+                break
+        
+        return None
+
+    def _retraso_cobertura(self):
+        """Retraso antes de cubrir: p95 de Yahoo, o el valor por defecto sin datos"""
+        p95 = self.salud.latencia('yahoo', 0.95)
+        if p95 is None:
+            return self.hedging.get('retraso_defecto', 1.5)
+        return max(self.hedging.get('retraso_minimo', 0.2), p95)
+
+    def _simbolos_sesion_activa(self):
+        """Activos de las sesiones abiertas ahora (MARKET_SESSIONS, hora UTC)"""
+        hora_utc = datetime.utcnow().hour
+        activos = set()
+        for sesion in MARKET_SESSIONS.values():
+            if sesion['inicio'] <= hora_utc < sesion['fin']:
+                activos.update(sesion['activos'])
+        return activos
+
+    def _get_executor(self):
+        """Pool para peticiones cubiertas (lazy loading)"""
+        with self._lock_executor:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.hedging.get('max_workers', 8),
+                    thread_name_prefix="hedging"
+                )
+        return self._executor
+
+    def obtener_precios_lote(self, simbolos):
+        """
+        Obtener precios de varios símbolos con una sola petición por proveedor
+
+        Primero Yahoo (spark multi-símbolo) y después Twelve Data (price con
+        símbolos separados por comas) para los que falten. Los símbolos que
+        ninguna fuente de lote resuelva no se incluyen en el resultado.
+        """
+        precios = {}
+        pendientes = list(dict.fromkeys(simbolos))
+
+        fuentes_red = {
+            'yahoo': self._obtener_precios_yahoo_lote,
+            'twelvedata': self._obtener_precios_twelvedata_lote
+        }
+        fuentes_lote = [fuentes_red[p] for p in self.salud.ordenar(list(fuentes_red))]
+
+        for fuente in fuentes_lote:
+            if not pendientes:
+                break
+
+            try:
+                precios.update(fuente(pendientes))
+            except Exception as e:
+                print(f"⚠️ Error en fuente {fuente.__name__}: {e}")
+                continue
+
+            pendientes = [s for s in pendientes if s not in precios]
+
+        return precios
+
+    def intervalo_sostenible_lote(self, simbolos):
+        """
+        Segundos mínimos entre lotes de estos símbolos para que Yahoo (una
+        llamada spark por bloque) no agote su presupuesto diario antes de
+        medianoche
+        """
+        bloques = len(self._preparar_peticiones_lote('yahoo', simbolos))
+        return self.rate_limiter.intervalo_sostenible('yahoo') * bloques
+
+    def _puede_consultar(self, proveedor, tokens=1):
+        """
+        Presupuesto disponible y circuito cerrado (o sondeo permitido)
+        
+        El presupuesto se mira antes que el circuito para que una llamada
+        que luego se salta por rate limit no ocupe el sondeo de SEMI_ABIERTO,
+        y se consume después para no gastarlo con el circuito abierto.
+        """
+        return (
+            self.rate_limiter.hay_presupuesto(proveedor, tokens)
+            and self.salud.permitir(proveedor)
+            and self.rate_limiter.puede_llamar_api(proveedor, tokens)
+        )
+
+    def _peticion(self, proveedor, url, parsear, **kwargs):
+        """
+        GET al proveedor y parseo de la respuesta, registrando latencia y
+        resultado en su salud. Solo es éxito si parsear devuelve datos
+        válidos: Twelve Data y Alpha Vantage responden 200 con un cuerpo de
+        error al agotar la cuota.
+        """
+        inicio = time.monotonic()
         try:
+            resp = transporte_http.get(url, **kwargs)
+            resultado = parsear(resp.json()) if resp.status_code == 200 else None
+        except Exception:
+            self.salud.registrar(proveedor, time.monotonic() - inicio, exito=False)
+            raise
+        
+        self.salud.registrar(proveedor, time.monotonic() - inicio, exito=bool(resultado))
+        return resultado
+
+    @staticmethod
+    def _precio_valido(precio):
+        """El precio si es positivo, si no None"""
+        return precio if precio is not None and precio > 0 else None
+
+    def _preparar_peticion_precio(self, proveedor, simbolo):
+        """
+        URL y argumentos de la petición de precio de un proveedor
+        None si el proveedor no cubre el símbolo (no se gasta presupuesto)
+        """
+        if proveedor == 'yahoo':
             yahoo_symbol = self._map_symbol(simbolo)
             if not yahoo_symbol:
                 return None
+            return f"{self.base_url}/{yahoo_symbol}", {
+                'params': {"range": "1d", "interval": "1m"},
+                'headers': {"User-Agent": "Mozilla/5.0"},
+                'timeout': 10
+            }
 
-            url = f"{self.base_url}/{yahoo_symbol}"
-            params = {"range": "1d", "interval": "1m"}
-            headers = {"User-Agent": "Mozilla/5.0"}
+        if proveedor == 'twelvedata':
+            td_symbol = self.td_symbols.get(simbolo)
+            if not td_symbol:
+                return None
+            return self.twelvedata_url, {
+                'params': {"symbol": td_symbol, "apikey": "demo"},
+                'timeout': 10
+            }
 
-            resp = requests.get(url, params=params, headers=headers, timeout=10)
-            if resp.status_code != 200:
+        if proveedor == 'alphavantage':
+            # Solo para los símbolos principales para conservar requests
+            av_symbol = self.av_symbols.get(simbolo)
+            if not av_symbol:
                 return None
+            return "https://www.alphavantage.co/query", {
+                'params': {
+                    "function": "CURRENCY_EXCHANGE_RATE",
+                    "from_currency": av_symbol[:-3],
+                    "to_currency": av_symbol[-3:],
+                    "apikey": "demo"
+                },
+                'timeout': 10
+            }
 
-            data = resp.json()
+        return None
+
+    def _parsear_precio(self, proveedor, data):
+        """Extraer el precio de la respuesta JSON de un proveedor"""
+        if proveedor == 'yahoo':
             result = data.get("chart", {}).get("result", [None])[0]
             if not result:
                 return None
@@ -79,62 +275,148 @@ class YahooFinanceAPI:
             for price in reversed(closes):
                 if price is not None:
                     return float(price)
+            return None
 
+        if proveedor == 'twelvedata':
+            precio = data.get('price')
+            return float(precio) if precio else None
+
+        if proveedor == 'alphavantage':
+            rate = data.get('Realtime Currency Exchange Rate', {}).get('5. Exchange Rate')
+            return float(rate) if rate else None
+
+        return None
+
+    def _obtener_precio_proveedor(self, proveedor, simbolo):
+        """Flujo común: preparar, consultar circuito y presupuesto, pedir y parsear"""
+        peticion = self._preparar_peticion_precio(proveedor, simbolo)
+        if not peticion or not self._puede_consultar(proveedor):
             return None
+
+        url, kwargs = peticion
+        return self._peticion(
+            proveedor, url,
+            lambda data: self._precio_valido(self._parsear_precio(proveedor, data)),
+            **kwargs
+        )
+
+    def _obtener_precio_yahoo(self, simbolo: str):
+        """Fuente principal - Yahoo Finance"""
+        try:
+            return self._obtener_precio_proveedor('yahoo', simbolo)
         except:
             return None
 
+    def _preparar_peticiones_lote(self, proveedor, simbolos):
+        """
+        Peticiones multi-símbolo de un proveedor: lista de (url, kwargs, mapeados)
+        donde mapeados traduce el símbolo del proveedor al interno
+        """
+        if proveedor == 'yahoo':
+            mapeados = {}
+            for simbolo in simbolos:
+                yahoo_symbol = self._map_symbol(simbolo)
+                if yahoo_symbol:
+                    mapeados[yahoo_symbol] = simbolo
+
+            peticiones = []
+            yahoo_symbols = list(mapeados)
+            for i in range(0, len(yahoo_symbols), self.max_simbolos_lote):
+                bloque = yahoo_symbols[i:i + self.max_simbolos_lote]
+                peticiones.append((self.spark_url, {
+                    'params': {"symbols": ",".join(bloque), "range": "1d", "interval": "1m"},
+                    'headers': {"User-Agent": "Mozilla/5.0"},
+                    'timeout': 10
+                }, {ys: mapeados[ys] for ys in bloque}))
+            return peticiones
+
+        if proveedor == 'twelvedata':
+            mapeados = {}
+            for simbolo in simbolos:
+                td_symbol = self.td_symbols.get(simbolo)
+                if td_symbol:
+                    mapeados[td_symbol] = simbolo
+
+            if not mapeados:
+                return []
+            return [(self.twelvedata_url, {
+                'params': {"symbol": ",".join(mapeados), "apikey": "demo"},
+                'timeout': 10
+            }, mapeados)]
+
+        return []
+
+    def _creditos_lote(self, proveedor, mapeados):
+        """Créditos que cobra una petición de lote: Twelve Data cobra uno por símbolo"""
+        return len(mapeados) if proveedor == 'twelvedata' else 1
+
+    def _parsear_precios_lote(self, proveedor, data, mapeados):
+        """Extraer {simbolo: precio} de una respuesta multi-símbolo"""
+        precios = {}
+
+        if proveedor == 'yahoo':
+            resultados = data.get("spark", {}).get("result") or []
+            for resultado in resultados:
+                simbolo = mapeados.get(resultado.get("symbol"))
+                respuesta = (resultado.get("response") or [None])[0]
+                if not simbolo or not respuesta:
+                    continue
+
+                closes = respuesta.get("indicators", {}).get("quote", [{}])[0].get("close", [])
+                for price in reversed(closes):
+                    if price is not None:
+                        precios[simbolo] = float(price)
+                        break
+
+        elif proveedor == 'twelvedata':
+            # Con un solo símbolo la respuesta no viene indexada por símbolo
+            if len(mapeados) == 1:
+                data = {next(iter(mapeados)): data}
+
+            for td_symbol, simbolo in mapeados.items():
+                item = data.get(td_symbol)
+                if not isinstance(item, dict) or not item.get('price'):
+                    continue
+                precio = float(item['price'])
+                if precio > 0:
+                    precios[simbolo] = precio
+
+        return precios
+
+    def _obtener_precios_proveedor_lote(self, proveedor, simbolos):
+        """Flujo común de lote: una petición por bloque, con circuito y presupuesto"""
+        precios = {}
+        for url, kwargs, mapeados in self._preparar_peticiones_lote(proveedor, simbolos):
+            if not self._puede_consultar(proveedor, self._creditos_lote(proveedor, mapeados)):
+                break
+
+            precios.update(self._peticion(
+                proveedor, url,
+                lambda data: self._parsear_precios_lote(proveedor, data, mapeados),
+                **kwargs
+            ) or {})
+
+        return precios
+
+    def _obtener_precios_yahoo_lote(self, simbolos):
+        """Yahoo Finance spark - varios símbolos por petición"""
+        return self._obtener_precios_proveedor_lote('yahoo', simbolos)
+
+    def _obtener_precios_twelvedata_lote(self, simbolos):
+        """Twelve Data price - símbolos separados por comas en una petición"""
+        return self._obtener_precios_proveedor_lote('twelvedata', simbolos)
+
     def _obtener_precio_twelvedata(self, simbolo: str):
         """Fuente alternativa - Twelve Data (800 req/día gratis)"""
         try:
-            # Mapeo a símbolos Twelve Data
-            td_symbols = {
-                "EURUSD": "EUR/USD", "USDCAD": "CAD/USD", "XAUUSD": "XAU/USD",
-                "SPX500": "SPX", "NAS100": "NAS100"
-            }
-            
-            td_symbol = td_symbols.get(simbolo)
-            if not td_symbol:
-                return None
-                
-            url = f"https://api.twelvedata.com/price?symbol={td_symbol}&apikey=demo"
-            resp = requests.get(url, timeout=10)
-            
-            if resp.status_code == 200:
-                data = resp.json()
-                return float(data.get('price', 0))
-                
-            return None
+            return self._obtener_precio_proveedor('twelvedata', simbolo)
         except:
             return None
 
     def _obtener_precio_alphavantage(self, simbolo: str):
         """Fuente alternativa - Alpha Vantage (25 req/día)"""
         try:
-            # Solo para los símbolos principales para conservar requests
-            if simbolo not in ['EURUSD', 'XAUUSD', 'SPX500']:
-                return None
-                
-            av_symbols = {
-                "EURUSD": "EURUSD", 
-                "XAUUSD": "XAUUSD",
-                "SPX500": "SPX"
-            }
-            
-            av_symbol = av_symbols.get(simbolo)
-            if not av_symbol:
-                return None
-                
-            url = f"https://www.alphavantage.co/query?function=CURRENCY_EXCHANGE_RATE&from_currency={av_symbol[:-3]}&to_currency={av_symbol[-3:]}&apikey=demo"
-            resp = requests.get(url, timeout=10)
-            
-            if resp.status_code == 200:
-                data = resp.json()
-                rate = data.get('Realtime Currency Exchange Rate', {}).get('5. Exchange Rate')
-                if rate:
-                    return float(rate)
-                    
-            return None
+            return self._obtener_precio_proveedor('alphavantage', simbolo)
         except:
             return None
 
@@ -150,28 +432,305 @@ class YahooFinanceAPI:
         precio_base = precios_base.get(simbolo, 1.0000)
         # Pequeña variación para simular movimiento real
         variacion = 1 + (time.time() % 0.01 - 0.005) / 100
-        return round(precio_base * variacion, 5)
+        return PrecioSimulado(round(precio_base * variacion, 5))
 
     def _map_symbol(self, simbolo: str):
         return self.symbol_mapping.get(simbolo, None)
 
+class SaludFuentes:
+    """
+    Salud por fuente: tasa de error y latencias p50/p95 en ventana móvil,
+    circuit breaker (CERRADO / ABIERTO / SEMI_ABIERTO) y orden dinámico
+    """
+
+    def __init__(self, config=None):
+        config = config or SALUD_FUENTES_CONFIG
+        self.ventana = config.get('ventana', 20)
+        self.min_muestras = config.get('min_muestras', 5)
+        self.umbral_error = config.get('umbral_error', 0.5)
+        self.enfriamiento = config.get('enfriamiento_segundos', 60)
+        self.fuentes = {}
+        self.lock = Lock()
+
+    def _fuente(self, proveedor):
+        if proveedor not in self.fuentes:
+            self.fuentes[proveedor] = {
+                'resultados': deque(maxlen=self.ventana),  # (exito, latencia)
+                'estado': 'CERRADO',
+                'abierto_desde': 0.0,
+                'sondeo_desde': None
+            }
+        return self.fuentes[proveedor]
+
+    def _actualizar_estado(self, fuente, ahora):
+        """ABIERTO pasa a SEMI_ABIERTO cuando termina el enfriamiento"""
+        if fuente['estado'] == 'ABIERTO' and ahora - fuente['abierto_desde'] >= self.enfriamiento:
+            fuente['estado'] = 'SEMI_ABIERTO'
+            fuente['sondeo_desde'] = None
+
+    def permitir(self, proveedor):
+        """¿Se puede llamar ahora a la fuente? En SEMI_ABIERTO, un sondeo a la vez"""
+        with self.lock:
+            fuente = self._fuente(proveedor)
+            ahora = time.monotonic()
+            self._actualizar_estado(fuente, ahora)
+            
+            if fuente['estado'] == 'CERRADO':
+                return True
+            if fuente['estado'] == 'ABIERTO':
+                return False
+            
+            # SEMI_ABIERTO: un sondeo (que caduca si nunca llega a registrarse)
+            if fuente['sondeo_desde'] is None or ahora - fuente['sondeo_desde'] >= self.enfriamiento:
+                fuente['sondeo_desde'] = ahora
+                return True
+            return False
+
+    def registrar(self, proveedor, latencia, exito):
+        """Registrar resultado de una llamada de red a la fuente"""
+        with self.lock:
+            fuente = self._fuente(proveedor)
+            ahora = time.monotonic()
+            fuente['resultados'].append((exito, latencia))
+            
+            if fuente['estado'] == 'SEMI_ABIERTO':
+                if exito:
+                    fuente['estado'] = 'CERRADO'
+                    fuente['resultados'].clear()
+                    fuente['resultados'].append((exito, latencia))
+                    print(f"✅ Circuito {proveedor} cerrado de nuevo")
+                else:
+                    fuente['estado'] = 'ABIERTO'
+                    fuente['abierto_desde'] = ahora
+                fuente['sondeo_desde'] = None
+                return
+            
+            resultados = fuente['resultados']
+            if fuente['estado'] == 'CERRADO' and len(resultados) >= self.min_muestras:
+                errores = sum(1 for ok, _ in resultados if not ok)
+                if errores / len(resultados) >= self.umbral_error:
+                    fuente['estado'] = 'ABIERTO'
+                    fuente['abierto_desde'] = ahora
+                    print(f"⛔ Circuito {proveedor} abierto: {errores}/{len(resultados)} errores")
+
+    def _percentil(self, latencias, q):
+        ordenadas = sorted(latencias)
+        return ordenadas[int(round(q * (len(ordenadas) - 1)))]
+
+    def latencia(self, proveedor, q=0.5):
+        """Percentil q de la latencia de llamadas exitosas (None sin datos)"""
+        with self.lock:
+            fuente = self.fuentes.get(proveedor)
+            if not fuente:
+                return None
+            latencias = [lat for ok, lat in fuente['resultados'] if ok]
+            return self._percentil(latencias, q) if latencias else None
+
+    def ordenar(self, proveedores):
+        """
+        Orden de prueba: sanas por p50 ascendente (sin datos después, en su
+        orden original), luego SEMI_ABIERTO; las ABIERTO se excluyen
+        """
+        with self.lock:
+            ahora = time.monotonic()
+            claves = []
+            for indice, proveedor in enumerate(proveedores):
+                fuente = self._fuente(proveedor)
+                self._actualizar_estado(fuente, ahora)
+                if fuente['estado'] == 'ABIERTO':
+                    continue
+                
+                latencias = [lat for ok, lat in fuente['resultados'] if ok]
+                p50 = self._percentil(latencias, 0.5) if latencias else float('inf')
+                semi_abierto = fuente['estado'] == 'SEMI_ABIERTO'
+                claves.append(((semi_abierto, p50, indice), proveedor))
+            
+            return [proveedor for _, proveedor in sorted(claves)]
+
+    def obtener_estadisticas(self):
+        """Estado, tasa de error y latencias p50/p95 por fuente"""
+        with self.lock:
+            ahora = time.monotonic()
+            resumen = {}
+            for proveedor, fuente in self.fuentes.items():
+                self._actualizar_estado(fuente, ahora)
+                resultados = fuente['resultados']
+                latencias = [lat for ok, lat in resultados if ok]
+                errores = sum(1 for ok, _ in resultados if not ok)
+                resumen[proveedor] = {
+                    'estado': fuente['estado'],
+                    'muestras': len(resultados),
+                    'tasa_error': round(errores / len(resultados), 3) if resultados else 0.0,
+                    'latencia_p50': round(self._percentil(latencias, 0.5), 4) if latencias else None,
+                    'latencia_p95': round(self._percentil(latencias, 0.95), 4) if latencias else None
+                }
+            return resumen
+
+
+class TokenBucket:
+    """Cubo de tokens con presupuesto por minuto y por día"""
+
+    def __init__(self, por_minuto, por_dia):
+        self.por_minuto = por_minuto
+        self.por_dia = por_dia
+        self.tokens_minuto = float(por_minuto)
+        self.ultima_recarga = time.time()
+        self.usados_hoy = 0
+        self.dia = datetime.now().date().isoformat()
+
+    def _recargar(self):
+        ahora = time.time()
+        transcurrido = max(0.0, ahora - self.ultima_recarga)
+        self.tokens_minuto = min(self.por_minuto, self.tokens_minuto + transcurrido * self.por_minuto / 60.0)
+        self.ultima_recarga = ahora
+
+        # Resetear presupuesto diario si es nuevo día
+        hoy = datetime.now().date().isoformat()
+        if hoy != self.dia:
+            self.usados_hoy = 0
+            self.dia = hoy
+
+    def disponible(self, tokens=1):
+        """¿Hay tokens suficientes? (sin consumirlos)"""
+        self._recargar()
+        return self.usados_hoy + tokens <= self.por_dia and self.tokens_minuto >= tokens
+
+    def consumir(self, tokens=1):
+        """Consumir tokens (créditos de API); False si no hay suficientes (nunca bloquea)"""
+        if not self.disponible(tokens):
+            return False
+        self.tokens_minuto -= tokens
+        self.usados_hoy += tokens
+        return True
+
+    def a_dict(self):
+        return {
+            'tokens_minuto': self.tokens_minuto,
+            'ultima_recarga': self.ultima_recarga,
+            'usados_hoy': self.usados_hoy,
+            'dia': self.dia
+        }
+
+    def cargar_dict(self, estado):
+        self.tokens_minuto = min(self.por_minuto, float(estado.get('tokens_minuto', self.por_minuto)))
+        self.ultima_recarga = float(estado.get('ultima_recarga', time.time()))
+        self.usados_hoy = int(estado.get('usados_hoy', 0))
+        self.dia = estado.get('dia', self.dia)
+
+
 class RateLimiter:
-    """Gestor inteligente de ratelimits para APIs gratuitas"""
+    """
+    Ratelimits por proveedor según FREE_APIS_CONFIG
+    Un cubo de tokens (minuto + día) por API, con estado persistente en disco
+    """
     
-    def __init__(self):
-        self.calls_today = 0
-        self.max_daily_calls = 800  # Conservador para APIs gratuitas
-        self.last_reset = datetime.now().date()
+    def __init__(self, config=None, ruta_estado=None):
+        config = config or FREE_APIS_CONFIG
+        self.ruta_estado = ruta_estado or os.path.join(DATA_DIR, "rate_limiter.json")
+        self.intervalo_guardado = 10  # segundos mínimos entre escrituras
+        self._ultimo_guardado = 0.0
+        self._cambios_sin_guardar = False
+        self.lock = Lock()
+        
+        self.buckets = {}
+        for proveedor, cfg in config.items():
+            if not isinstance(cfg, dict) or 'requests_per_day' not in cfg:
+                continue
+            if not cfg.get('enabled', True):
+                continue
+            self.buckets[proveedor] = TokenBucket(
+                cfg.get('requests_per_minute', cfg['requests_per_day']),
+                cfg['requests_per_day']
+            )
+        
+        self._cargar_estado()
+        atexit.register(self.guardar_estado)
     
-    def puede_llamar_api(self):
-        # Resetear contador si es nuevo día
-        if datetime.now().date() != self.last_reset:
-            self.calls_today = 0
-            self.last_reset = datetime.now().date()
-        
-        if self.calls_today < self.max_daily_calls:
-            self.calls_today += 1
+    def hay_presupuesto(self, proveedor, tokens=1):
+        """Comprobar presupuesto sin consumirlo"""
+        with self.lock:
+            bucket = self.buckets.get(proveedor)
+            return bucket is not None and bucket.disponible(tokens)
+    
+    def intervalo_sostenible(self, proveedor):
+        """Segundos entre llamadas para repartir lo que queda del presupuesto diario hasta medianoche"""
+        with self.lock:
+            bucket = self.buckets.get(proveedor)
+            if bucket is None:
+                return 0.0
+            bucket._recargar()
+            restantes = bucket.por_dia - bucket.usados_hoy
+        
+        ahora = datetime.now()
+        hasta_medianoche = (datetime.combine(ahora.date() + timedelta(days=1), datetime.min.time()) - ahora).total_seconds()
+        return hasta_medianoche / restantes if restantes > 0 else hasta_medianoche
+    
+    def puede_llamar_api(self, proveedor, tokens=1):
+        """
+        Consumir una llamada del proveedor sin bloquear
+        tokens = créditos que cobra la llamada (p. ej. uno por símbolo en un lote de Twelve Data)
+        False = saltar este proveedor y probar el siguiente
+        """
+        with self.lock:
+            bucket = self.buckets.get(proveedor)
+            if bucket is None:
+                return False
+            
+            if not bucket.consumir(tokens):
+                print(f"⚠️ Ratelimit {proveedor}: {bucket.usados_hoy}/{bucket.por_dia} hoy, saltando proveedor")
+                return False
+            
+            self._cambios_sin_guardar = True
+            if time.time() - self._ultimo_guardado >= self.intervalo_guardado:
+                self._guardar_estado()
             return True
+    
+    def obtener_estado(self):
+        """Uso actual de cada proveedor"""
+        with self.lock:
+            return {
+                proveedor: {
+                    'usados_hoy': bucket.usados_hoy,
+                    'max_diario': bucket.por_dia,
+                    'tokens_minuto': round(bucket.tokens_minuto, 2),
+                    'max_por_minuto': bucket.por_minuto
+                }
+                for proveedor, bucket in self.buckets.items()
+            }
+    
+    def guardar_estado(self):
+        with self.lock:
+            if self._cambios_sin_guardar:
+                self._guardar_estado()
+    
+    def _guardar_estado(self):
+        """Escritura atómica del estado de los cubos"""
+        try:
+            os.makedirs(os.path.dirname(self.ruta_estado) or ".", exist_ok=True)
+            temporal = f"{self.ruta_estado}.tmp"
+            with open(temporal, "w") as f:
+                json.dump({p: b.a_dict() for p, b in self.buckets.items()}, f)
+            os.replace(temporal, self.ruta_estado)
+            self._ultimo_guardado = time.time()
+            self._cambios_sin_guardar = False
+        except OSError as e:
+            print(f"⚠️ No se pudo guardar estado de ratelimits: {e}")
+    
+    def _cargar_estado(self):
+        """Recuperar el consumo previo tras un reinicio"""
+        try:
+            with open(self.ruta_estado) as f:
+                estado = json.load(f)
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError) as e:
+            print(f"⚠️ Estado de ratelimits ilegible, se reinicia: {e}")
+            return
         
-        print(f"⚠️ Ratelimit alcanzado: {self.calls_today}/{self.max_daily_calls}")
-        return False
+        for proveedor, bucket in self.buckets.items():
+            if isinstance(estado.get(proveedor), dict):
+                bucket.cargar_dict(estado[proveedor])
+
+# Instancias globales: presupuesto y salud son del proceso, no de cada cliente
+rate_limiter = RateLimiter()
+salud_fuentes = SaludFuentes()